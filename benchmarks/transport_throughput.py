@@ -0,0 +1,226 @@
+"""
+    Author: Ege Bilecen
+    Compares the throughput of loopback TCP and UNIX domain socket transports.
+
+    Each transport is measured on three paths:
+    - client -> server: Masked frames sent to server. Bound by the unmasking done in Python, so it hides the transport's cost.
+    - server -> client: Frames sent with WebsocketServer.send_data to a client that reads the raw bytes without decoding them.
+    - raw socket      : Same bytes written to an accepted socket of the transport, without websocket framing. Ceiling of the transport.
+
+    Usage: python benchmarks/transport_throughput.py [message_size] [message_count]
+"""
+
+import base64
+import os
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pywebsocket.server       import WebsocketServer
+from pywebsocket.transport    import SocketOptions, TCPTransport, UnixTransport
+from pywebsocket.custom_types import FrameType
+
+## Encodes a masked binary frame as a client would send it.
+def encode_client_frame(data : bytes) -> bytes:
+    mask_key = os.urandom(4)
+    header   = bytearray([0x82])
+    data_len = len(data)
+
+    if   data_len <= 125:    header.append(0x80 | data_len)
+    elif data_len <= 0xFFFF: header += bytes([0x80 | 126]) + struct.pack("!H", data_len)
+    else:                    header += bytes([0x80 | 127]) + struct.pack("!Q", data_len)
+
+    mask     = (mask_key * (data_len // 4 + 1))[:data_len]
+    masked   = (int.from_bytes(data, "big") ^ int.from_bytes(mask, "big")).to_bytes(data_len, "big")
+
+    return bytes(header) + mask_key + masked
+
+## Connects to server, sends the handshake request and returns the socket.
+def connect(family : int,
+            addr) -> socket.socket:
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.connect(addr)
+    sock.sendall(("GET / HTTP/1.1\r\n"
+                  "Host: localhost\r\n"
+                  "Upgrade: websocket\r\n"
+                  "Connection: Upgrade\r\n"
+                  "Sec-WebSocket-Key: {}\r\n"
+                  "Sec-WebSocket-Version: 13\r\n\r\n").format(base64.b64encode(os.urandom(16)).decode()).encode())
+    sock.recv(4096)
+
+    return sock
+
+## Reads from the socket until byte_count bytes are received.
+def read_bytes(sock       : socket.socket,
+               byte_count : int) -> None:
+    buffer = bytearray(262144)
+
+    while byte_count > 0:
+        received_len = sock.recv_into(buffer)
+
+        if received_len == 0:
+            raise ConnectionError("Connection closed after receiving {} less bytes than expected.".format(byte_count))
+
+        byte_count -= received_len
+
+## Starts a server on the transport with on_connect and on_data as it's "client_connect" and "client_data" special handlers.
+def start_server(transport    : object,
+                 message_size : int,
+                 on_connect   = None,
+                 on_data      = None) -> WebsocketServer:
+    # Each message is sent as a single frame.
+    server = WebsocketServer(client_buffer_size       = 65536,
+                             daemon_handshake_handler = True,
+                             send_fragment_size       = max(65536, message_size),
+                             transport                = transport)
+
+    if on_connect is not None: server.set_special_handler("client_connect", on_connect)
+    if on_data    is not None: server.set_special_handler("client_data",    on_data)
+
+    server.start()
+
+    return server
+
+## Sends message_count masked messages from client to server and returns the throughput in MB/s.
+def run_client_to_server(transport     : object,
+                         family        : int,
+                         addr,
+                         message_size  : int,
+                         message_count : int) -> float:
+    done_event     = threading.Event()
+    received_count = [0]
+
+    def on_client_data(server, client, data) -> None:
+        received_count[0] += 1
+
+        if received_count[0] == message_count:
+            done_event.set()
+
+    server = start_server(transport, message_size, on_data=on_client_data)
+    frame  = encode_client_frame(os.urandom(message_size))
+    sock   = connect(family, addr)
+
+    start_time = time.perf_counter()
+
+    for _ in range(message_count):
+        sock.sendall(frame)
+
+    done_event.wait()
+    elapsed_time = time.perf_counter() - start_time
+
+    sock.close()
+    server.stop()
+
+    return (message_size * message_count) / elapsed_time / 1048576
+
+## Sends message_count messages from server to client with WebsocketServer.send_data and returns the throughput in MB/s.
+# Client reads the raw bytes, so neither side unmasks anything.
+def run_server_to_client(transport     : object,
+                         family        : int,
+                         addr,
+                         message_size  : int,
+                         message_count : int) -> float:
+    connect_event = threading.Event()
+    client_list   = []
+
+    def on_client_connect(server, client) -> None:
+        client_list.append(client)
+        connect_event.set()
+
+    server = start_server(transport, message_size, on_connect=on_client_connect)
+    data   = os.urandom(message_size)
+    sock   = connect(family, addr)
+
+    connect_event.wait()
+    socket_id = client_list[0].get_id()
+
+    def send() -> None:
+        for _ in range(message_count):
+            server.send_data(socket_id, data)
+
+    sender_thread = threading.Thread(target=send, args=())
+    sender_thread.daemon = True
+
+    start_time = time.perf_counter()
+
+    sender_thread.start()
+    read_bytes(sock, len(WebsocketServer._encode_data(data, FrameType.BINARY_FRAME)) * message_count)
+
+    elapsed_time = time.perf_counter() - start_time
+
+    sock.close()
+    server.stop()
+
+    return (message_size * message_count) / elapsed_time / 1048576
+
+## Writes message_count messages to an accepted socket of the transport without websocket framing and returns the throughput in MB/s.
+def run_raw_socket(transport     : object,
+                   family        : int,
+                   addr,
+                   message_size  : int,
+                   message_count : int) -> float:
+    transport.listen()
+
+    data = os.urandom(message_size)
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.connect(addr)
+
+    conn, _ = transport.accept()
+
+    def send() -> None:
+        for _ in range(message_count):
+            conn.sendall(data)
+
+    sender_thread = threading.Thread(target=send, args=())
+    sender_thread.daemon = True
+
+    start_time = time.perf_counter()
+
+    sender_thread.start()
+    read_bytes(sock, message_size * message_count)
+
+    elapsed_time = time.perf_counter() - start_time
+
+    sock.close()
+    conn.close()
+    transport.close()
+
+    return (message_size * message_count) / elapsed_time / 1048576
+
+## Gets a free loopback TCP port.
+def get_free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+if __name__ == "__main__":
+    message_size  = int(sys.argv[1]) if len(sys.argv) > 1 else 16384
+    message_count = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+
+    options  = SocketOptions(tcp_nodelay=True)
+    temp_dir = tempfile.mkdtemp()
+
+    def tcp_run(run_func) -> float:
+        port = get_free_port()
+        return run_func(TCPTransport("127.0.0.1", port, options), socket.AF_INET, ("127.0.0.1", port), message_size, message_count)
+
+    def unix_run(run_func) -> float:
+        unix_path = os.path.join(temp_dir, "pywebsocket-{}.sock".format(run_func.__name__))
+        return run_func(UnixTransport(unix_path, options=options), socket.AF_UNIX, unix_path, message_size, message_count)
+
+    path_list = [
+        ("client -> server", run_client_to_server),
+        ("server -> client", run_server_to_client),
+        ("raw socket",       run_raw_socket)
+    ]
+
+    print("{} messages of {} bytes".format(message_count, message_size))
+    print("{:<18}{:>16}{:>16}".format("Path", "Loopback TCP", "UNIX socket"))
+
+    for name, run_func in path_list:
+        print("{:<18}{:>11.1f} MB/s{:>11.1f} MB/s".format(name, tcp_run(run_func), unix_run(run_func)))
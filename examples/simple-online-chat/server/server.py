@@ -1,8 +1,12 @@
 from pywebsocket.server import WebsocketServer
+from pywebsocket.custom_types import FrameType
 from random import random
 from urllib.parse import unquote
 import json
 
+def room_topic(room_id):
+    return "room:{}".format(room_id)
+
 # HANDLERS
 def setNickname(server, socket, data):
     if socket.data["isTakenNickname"]:
@@ -31,8 +35,7 @@ def newRoom(server, socket, data):
             "roomID"      : random(),
             "roomName"    : data["roomName"],
             "ownerID"     : socket.data["userID"],
-            "userList"    : [], # stored as nickname and user id pair
-            "chatHistory" : []
+            "userList"    : [] # stored as nickname and user id pair
         }
 
         server.room_list.append(room)
@@ -64,11 +67,18 @@ def enterRoom(server, socket, data):
             if socket.data["currentRoomID"] is not room["roomID"]:
                 room["userList"].append((socket.data["userID"], socket.data["nickname"]))
 
+                # no message of the old room can arrive after the response
+                if socket.data["currentRoomID"] is not None:
+                    server.unsubscribe(socket.get_id(), room_topic(socket.data["currentRoomID"]))
+
                 dict = {
                     "where" : "enterRoomResponse",
-                    "data"  : {"code":1, "room_name":room["roomName"],"room_user_list":room["userList"], "chat_history":room["chatHistory"]}
+                    "data"  : {"code":1, "roomID":room["roomID"], "room_name":room["roomName"],"room_user_list":room["userList"]}
                 }
                 server.send_json(socket.get_id(), dict)
+
+                # subscribe and send the messages client has missed before any new one
+                server.subscribe(socket.get_id(), room_topic(room["roomID"]), data.get("lastSeq", 0))
                 
                 socket.data["currentRoomID"] = room["roomID"]
 
@@ -92,23 +102,17 @@ def chatNewMessage(server, socket, data):
     if socket.data["currentRoomID"] == data["roomID"]:
         for room in server.room_list:
             if room["roomID"] == socket.data["currentRoomID"]:
-                room["chatHistory"].append({
-                    "senderID"       : socket.data["userID"],
-                    "senderNickname" : socket.data["nickname"],
-                    "message"        : data["message"]
-                })
-
-                for user in server.user_list:
-                    if user["data"]["currentRoomID"] == room["roomID"]:
-                        dict = {
-                            "where" : "chatNewMessageResponse",
-                            "data"  : {
-                                "senderID"       : socket.data["userID"],
-                                "senderNickname" : socket.data["nickname"],
-                                "message"        : data["message"]
-                            }
-                        }
-                        server.send_json(user["socket"].get_id(), dict)
+                # encoded once, kept in room's history and sent to everyone in the room
+                server.publish(room_topic(room["roomID"]), lambda seq: json.dumps({
+                    "where" : "chatNewMessageResponse",
+                    "data"  : {
+                        "seq"            : seq,
+                        "roomID"         : room["roomID"],
+                        "senderID"       : socket.data["userID"],
+                        "senderNickname" : socket.data["nickname"],
+                        "message"        : data["message"]
+                    }
+                }).encode("utf-8"), FrameType.TEXT_FRAME)
 
     else: return False
 
@@ -136,6 +140,7 @@ def client_disconnect(server, socket):
                         for j, _room in enumerate(server.room_list):
                             if _room["roomID"] == room["roomID"]:
                                 server.room_list.pop(j)
+                                server.get_replay_buffer().remove_topic(room_topic(room["roomID"]))
                                 dict = {
                                     "where" : "getRoomListResponse",
                                     "data"  : server.room_list
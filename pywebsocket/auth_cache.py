@@ -0,0 +1,156 @@
+"""
+    Author: Ege Bilecen
+"""
+
+from typing      import Callable, Hashable
+from collections import OrderedDict
+import threading
+import time
+
+## AuthCache
+# TTL bounded LRU cache of handshake_auth results, so expensive token checks run once per token instead of once per reconnect.
+class AuthCache:
+    ## Constructor of AuthCache.
+    # @param ttl Number of seconds a result stays valid.
+    # @param max_size Maximum number of results kept. Least recently used result is dropped when the cache is full.
+    # @param key_func Callable that receives the request dictionary passed to "handshake_auth" and returns the cache key. If it returns None, result won't be cached. If set to None, AuthCache.default_key will be used.
+    # @param rejection_ttl Number of seconds a rejection stays valid. If set to None, rejections aren't cached.
+    # @param max_rejection_size Maximum number of rejections kept. Rejections are kept apart from accepted results, so requests with made up credentials can't evict them.
+    # @warning A cached result is reused for every request with the same key, so the key must contain every part of the request the handler checks.
+    def __init__(self,
+                 ttl                : float                      = 60.0,
+                 max_size           : int                        = 10000,
+                 key_func           : Callable[[dict], Hashable] = None,
+                 rejection_ttl      : float                      = None,
+                 max_rejection_size : int                        = 1000) -> None:
+        if ttl <= 0:      raise ValueError("ttl must be bigger than 0.")
+        if max_size <= 0: raise ValueError("max_size must be bigger than 0.")
+
+        if rejection_ttl is not None and rejection_ttl <= 0: raise ValueError("rejection_ttl must be bigger than 0.")
+        if max_rejection_size <= 0:                          raise ValueError("max_rejection_size must be bigger than 0.")
+
+        self._ttl                = ttl
+        self._max_size           = max_size
+        self._key_func           = key_func if key_func is not None else AuthCache.default_key
+        self._result_list        = OrderedDict()
+        self._rejection_ttl      = rejection_ttl
+        self._max_rejection_size = max_rejection_size
+        self._rejection_list     = OrderedDict()
+        self._lock               = threading.Lock()
+
+        # Statistics
+        self._hit_count   = 0
+        self._miss_count  = 0
+
+    ## Default cache key. Uses the path, the credentials a client can send (Authorization header, cookies and query string),
+    # the Origin header and the client's host address, so Origin and IP address checks of the handler aren't bypassed by a cached result.
+    # @param request Request dictionary passed to "handshake_auth".
+    @staticmethod
+    def default_key(request : dict) -> Hashable:
+        header_list = request["headers"]
+        addr        = request["addr"]
+
+        # Port changes on every connection, only the host is a part of the key.
+        host = addr[0] if isinstance(addr, tuple) else addr
+
+        return (request["path"],
+                header_list.get("Authorization"),
+                header_list.get("Cookie"),
+                request["query_string"],
+                header_list.get("Origin"),
+                host)
+
+    ## Gets the key of the request. None if request shouldn't be cached.
+    # @param request Request dictionary passed to "handshake_auth".
+    def get_key(self,
+                request : dict) -> Hashable:
+        return self._key_func(request)
+
+    ## Gets the valid entry of the key from the list. Expired entry is removed. Must be called while holding the lock.
+    # @param entry_list List of the entries.
+    # @param key Cache key.
+    @staticmethod
+    def _get_entry(entry_list : OrderedDict,
+                   key        : Hashable) -> object:
+        entry = entry_list.get(key)
+
+        if entry is None:
+            return None
+
+        expire_time, result = entry
+
+        if expire_time <= time.monotonic():
+            del entry_list[key]
+            return None
+
+        entry_list.move_to_end(key)
+
+        return result
+
+    ## Gets the cached result of the key. Returns None if there is no valid result.
+    # @param key Cache key.
+    def get(self,
+            key : Hashable) -> object:
+        with self._lock:
+            result = AuthCache._get_entry(self._result_list, key)
+
+            if result is None:
+                result = AuthCache._get_entry(self._rejection_list, key)
+
+            if result is None:
+                self._miss_count += 1
+                return None
+
+            self._hit_count += 1
+
+            return result
+
+    ## Caches the result of the key.
+    # @param key Cache key.
+    # @param result Result that will be cached.
+    # @param is_rejection If set to True, result is kept with the rejections, or isn't cached at all if rejection_ttl is None.
+    def set(self,
+            key          : Hashable,
+            result       : object,
+            is_rejection : bool = False) -> None:
+        if is_rejection:
+            if self._rejection_ttl is None:
+                return
+
+            entry_list, ttl, max_size = self._rejection_list, self._rejection_ttl, self._max_rejection_size
+        else:
+            entry_list, ttl, max_size = self._result_list, self._ttl, self._max_size
+
+        with self._lock:
+            # A key has a single result, the newest one.
+            self._result_list.pop(key, None)
+            self._rejection_list.pop(key, None)
+
+            entry_list[key] = (time.monotonic() + ttl, result)
+
+            while len(entry_list) > max_size:
+                entry_list.popitem(last=False)
+
+    ## Removes the cached result of the key, such as when a token is revoked.
+    # @param key Cache key.
+    def invalidate(self,
+                   key : Hashable) -> None:
+        with self._lock:
+            self._result_list.pop(key, None)
+            self._rejection_list.pop(key, None)
+
+    ## Removes all cached results.
+    def clear(self) -> None:
+        with self._lock:
+            self._result_list.clear()
+            self._rejection_list.clear()
+
+    ## Gets the hit/miss counters and the number of cached results and rejections.
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits"       : self._hit_count,
+                "misses"     : self._miss_count,
+                "size"       : len(self._result_list),
+                "rejections" : len(self._rejection_list)
+            }
@@ -0,0 +1,91 @@
+"""
+    Author: Ege Bilecen
+"""
+
+from typing import Iterable
+import threading
+
+## BufferPool
+# Size-classed pool of reusable receive buffers shared by all connections of a server.
+class BufferPool:
+    ## Default size classes (in bytes) used when none are given.
+    DEFAULT_SIZE_CLASSES = (2048, 16384, 65536, 262144, 1048576)
+
+    ## Constructor of BufferPool.
+    # @param size_classes Buffer sizes that will be pooled. Requests are served from the smallest class that fits.
+    # @param max_free_per_class Maximum number of free buffers kept for each size class. Released buffers beyond this limit are dropped.
+    def __init__(self,
+                 size_classes       : Iterable[int] = DEFAULT_SIZE_CLASSES,
+                 max_free_per_class : int           = 64) -> None:
+        self._size_classes       = sorted(set(size_classes))
+        self._max_free_per_class = max_free_per_class
+        self._free_list          = {size : [] for size in self._size_classes}
+        self._lock               = threading.Lock()
+
+        if not self._size_classes or self._size_classes[0] <= 0:
+            raise ValueError("Size classes must contain at least one positive size.")
+
+        # Statistics
+        self._hit_count      = 0
+        self._miss_count     = 0
+        self._oversize_count = 0
+
+    ## Gets the smallest size class that can hold size bytes. Returns None if size is bigger than the largest class.
+    # @param size Requested size in bytes.
+    def _get_size_class(self,
+                        size : int) -> int:
+        for size_class in self._size_classes:
+            if size_class >= size:
+                return size_class
+
+        return None
+
+    ## Takes a buffer that is at least size bytes long from the pool.
+    # @param size Requested size in bytes.
+    # @note Buffers bigger than the largest size class are allocated with the exact size and are not pooled.
+    def acquire(self,
+                size : int) -> bytearray:
+        size_class = self._get_size_class(size)
+
+        with self._lock:
+            if size_class is None:
+                self._oversize_count += 1
+                return bytearray(size)
+
+            free_list = self._free_list[size_class]
+
+            if free_list:
+                self._hit_count += 1
+                return free_list.pop()
+
+            self._miss_count += 1
+
+        return bytearray(size_class)
+
+    ## Gives the buffer back to the pool.
+    # @param buffer Buffer that was taken with BufferPool.acquire.
+    # @warning Buffer must not be used after it has been released.
+    def release(self,
+                buffer : bytearray) -> None:
+        free_list = self._free_list.get(len(buffer))
+
+        if free_list is None:
+            return
+
+        with self._lock:
+            if len(free_list) < self._max_free_per_class:
+                free_list.append(buffer)
+
+    ## Gets the size classes of the pool.
+    def get_size_classes(self) -> list:
+        return list(self._size_classes)
+
+    ## Gets the hit/miss counters and the number of free buffers of each size class.
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits"      : self._hit_count,
+                "misses"    : self._miss_count,
+                "oversize"  : self._oversize_count,
+                "free"      : {size : len(free_list) for size, free_list in self._free_list.items()}
+            }
@@ -15,3 +15,27 @@ class ControlFrame:
     CLOSE_FRAME = 0x08
     PING_FRAME  = 0x09
     PONG_FRAME  = 0x0A
+
+## SendPriority
+# Contains the priority classes of the frames that are sent to a client. Lower value is sent first.
+class SendPriority:
+    CONTROL = 0x00
+    HIGH    = 0x01
+    BULK    = 0x02
+
+## RouteType
+# Contains the constants that specifies how a route's pattern is matched against the request path.
+class RouteType:
+    EXACT  = 0x00
+    PREFIX = 0x01
+    REGEX  = 0x02
+
+## LogSubsystem
+# Contains the names of the subsystems that have their own logger. Logger of a subsystem is named "pywebsocket.<subsystem>".
+class LogSubsystem:
+    SERVER    = "server"
+    HANDSHAKE = "handshake"
+    FRAMES    = "frames"
+    HANDLERS  = "handlers"
+    CLOSE     = "close"
+    TRACE     = "trace"
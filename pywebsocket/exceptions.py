@@ -30,10 +30,22 @@ class CLOSE_CONNECTION(Exception):
 class MASK_ERROR(Exception):
     pass
 
+## Raised when a frame or a fragmented message sent from client is longer than the server's limit.
+class MESSAGE_TOO_BIG(Exception):
+    pass
+
 ## Raised when socket id is not in client socket list.
 class INVALID_SOCKET_ID(Exception):
     pass
 
+## Raised when data is sent to a socket which connection is closed or broken.
+class SOCKET_CLOSED(Exception):
+    pass
+
+## Raised when data is posted to a socket which already has the maximum number of posted items queued.
+class SEND_QUEUE_FULL(Exception):
+    pass
+
 ## Exceptions related with opening handshake.
 class HANDSHAKE:
     ## Raised when invalid HTTP method detected.
@@ -55,3 +67,15 @@ class HANDSHAKE:
     ## Raised when a field's value doesn't match with expected value.
     class FIELD_VALUE_MISMATCH(Exception):
         pass
+
+    ## Raised when request path doesn't match with any route.
+    class ROUTE_NOT_FOUND(Exception):
+        pass
+
+    ## Raised when "handshake_auth" special handler rejects the request with 401 Unauthorized.
+    class UNAUTHORIZED(Exception):
+        pass
+
+    ## Raised when "handshake_auth" special handler rejects the request with 403 Forbidden.
+    class FORBIDDEN(Exception):
+        pass
@@ -0,0 +1,140 @@
+"""
+    Author: Ege Bilecen
+"""
+
+from typing      import Callable
+from collections import deque
+import selectors
+import socket
+import threading
+
+## Hibernator
+# Parks the sockets of idle clients in a shared selector (epoll on Linux) so they don't need a thread of their own.
+# A single thread waits for all parked sockets and hands a client back to revive_func when it's socket becomes readable.
+class Hibernator:
+    ## Constructor of Hibernator.
+    # @param revive_func Callable that will be called with the client when it's socket becomes readable.
+    # @param close_func Callable that will be called with each parked client when hibernator is stopped.
+    def __init__(self,
+                 revive_func : Callable,
+                 close_func  : Callable) -> None:
+        self._revive_func  = revive_func
+        self._close_func   = close_func
+        self._client_list  = {}
+        self._pending_list = deque()
+        self._lock         = threading.Lock()
+        self._selector     = None
+        self._thread       = None
+        self._wakeup_read  = None
+        self._wakeup_write = None
+        self._is_running   = False
+        self._is_stopped   = False
+
+    ## Starts the hibernation thread.
+    def _start(self) -> None:
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_read, self._wakeup_write = socket.socketpair()
+        self._wakeup_read.setblocking(False)
+        self._wakeup_write.setblocking(False)
+        self._selector.register(self._wakeup_read, selectors.EVENT_READ)
+
+        self._is_running = True
+        self._thread     = threading.Thread(target=self._run, args=(self._selector, self._wakeup_read, self._wakeup_write))
+        self._thread.daemon = True
+        self._thread.start()
+
+    ## Wakes up the hibernation thread so it processes the pending list. Must be called while holding the lock.
+    def _wakeup(self) -> None:
+        try:
+            self._wakeup_write.send(b"\x00")
+        except BlockingIOError:
+            # Thread already has pending wake ups.
+            pass
+
+    ## Loop of the hibernation thread. All selector modifications are made in this thread.
+    # @param selector Selector of the thread. Passed in so the thread never uses one that it doesn't own.
+    # @param wakeup_read Read end of the wake up socket pair.
+    # @param wakeup_write Write end of the wake up socket pair.
+    def _run(self,
+             selector     : selectors.BaseSelector,
+             wakeup_read  : socket.socket,
+             wakeup_write : socket.socket) -> None:
+        while self._is_running:
+            with self._lock:
+                while self._pending_list:
+                    client = self._pending_list.popleft()
+                    selector.register(client.get_socket(), selectors.EVENT_READ, client)
+
+            for key, _ in selector.select():
+                if key.fileobj is wakeup_read:
+                    try:
+                        while wakeup_read.recv(4096): pass
+                    except BlockingIOError:
+                        pass
+                    continue
+
+                client = key.data
+                selector.unregister(key.fileobj)
+
+                with self._lock:
+                    self._client_list.pop(client.get_id(), None)
+
+                self._revive_func(client)
+
+        # Parked sockets would never be revived or closed once the selector is closed.
+        with self._lock:
+            client_list = list(self._client_list.values())
+            self._client_list.clear()
+            self._pending_list.clear()
+
+        for key in list(selector.get_map().values()):
+            selector.unregister(key.fileobj)
+
+        selector.close()
+        wakeup_read.close()
+        wakeup_write.close()
+
+        for client in client_list:
+            self._close_func(client)
+
+    ## Parks the client's socket. Client will be revived when data arrives. If hibernator has been stopped, client is passed to close_func instead.
+    # @param client Client that will be hibernated.
+    def park(self,
+             client : object) -> None:
+        with self._lock:
+            is_stopped = self._is_stopped
+
+            if not is_stopped:
+                if not self._is_running:
+                    self._start()
+
+                self._client_list[client.get_id()] = client
+                self._pending_list.append(client)
+                self._wakeup()
+
+        if is_stopped:
+            self._close_func(client)
+
+    ## Gets the number of hibernated clients.
+    def get_count(self) -> int:
+        return len(self._client_list)
+
+    ## Gets whether the client with given socket ID is hibernated.
+    # @param socket_id Socket ID of the client.
+    def is_hibernated(self,
+                      socket_id : int) -> bool:
+        return socket_id in self._client_list
+
+    ## Stops the hibernation thread. Parked clients are passed to close_func before the thread exits, and clients parked later are passed to it right away.
+    def stop(self) -> None:
+        with self._lock:
+            if self._is_stopped:
+                return
+
+            self._is_stopped = True
+
+            if not self._is_running:
+                return
+
+            self._is_running = False
+            self._wakeup()
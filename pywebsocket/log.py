@@ -0,0 +1,85 @@
+"""
+    Author: Ege Bilecen
+"""
+
+from typing import Union
+import logging
+import sys
+
+## Name of the parent logger of all subsystem loggers.
+ROOT_LOGGER_NAME = "pywebsocket"
+
+# Library doesn't print anything unless the application configures logging or enables debug output.
+logging.getLogger(ROOT_LOGGER_NAME).addHandler(logging.NullHandler())
+
+_debug_handler    = None
+_debug_prev_level = logging.NOTSET
+
+## StructuredFormatter
+# Formats the records as "pywebsocket - <subsystem> - <message> (key=value, ...)".
+class StructuredFormatter(logging.Formatter):
+    def format(self,
+               record : logging.LogRecord) -> str:
+        message    = "{} - {}".format(record.name.replace(".", " - ", 1), record.getMessage())
+        field_list = getattr(record, "fields", None)
+
+        if field_list:
+            message += " ({})".format(", ".join("{}={}".format(key, value) for key, value in field_list.items()))
+
+        if record.exc_info:
+            message += "\n" + self.formatException(record.exc_info)
+
+        return message
+
+## Gets the logger of the subsystem.
+# @param subsystem Subsystem name. See custom_types.LogSubsystem.
+def get_logger(subsystem : str) -> logging.Logger:
+    return logging.getLogger("{}.{}".format(ROOT_LOGGER_NAME, subsystem))
+
+## Sets the log level of a subsystem, or of all subsystems if subsystem is None.
+# @param level Log level such as logging.DEBUG.
+# @param subsystem Subsystem name. See custom_types.LogSubsystem.
+def set_level(level     : Union[int, str],
+              subsystem : str = None) -> None:
+    logger = logging.getLogger(ROOT_LOGGER_NAME) if subsystem is None else get_logger(subsystem)
+    logger.setLevel(level)
+
+## Logs the event with structured fields. Fields are stored in the "fields" attribute of the log record.
+# @param logger Logger of the subsystem.
+# @param level Log level.
+# @param msg Message.
+# @note Guard hot paths with logger.isEnabledFor(level) so the fields aren't built when the level is disabled.
+def log_event(logger : logging.Logger,
+              level  : int,
+              msg    : str,
+              **fields) -> None:
+    logger.log(level, msg, extra={"fields" : fields})
+
+## Prints the events of all subsystems to stdout. Used by WebsocketServer's debug option.
+# @warning Output isn't scoped to a server. "pywebsocket" logger is set to DEBUG level and events of every server in the process are printed until disable_debug_output is called.
+def enable_debug_output() -> None:
+    global _debug_handler, _debug_prev_level
+
+    if _debug_handler is not None:
+        return
+
+    _debug_handler = logging.StreamHandler(sys.stdout)
+    _debug_handler.setFormatter(StructuredFormatter())
+
+    root_logger       = logging.getLogger(ROOT_LOGGER_NAME)
+    _debug_prev_level = root_logger.level
+    root_logger.addHandler(_debug_handler)
+    root_logger.setLevel(logging.DEBUG)
+
+## Stops printing the events to stdout and restores the log level that was set before enable_debug_output was called.
+def disable_debug_output() -> None:
+    global _debug_handler
+
+    if _debug_handler is None:
+        return
+
+    root_logger = logging.getLogger(ROOT_LOGGER_NAME)
+    root_logger.removeHandler(_debug_handler)
+    root_logger.setLevel(_debug_prev_level)
+
+    _debug_handler = None
@@ -0,0 +1,235 @@
+"""
+    Author: Ege Bilecen
+"""
+
+from typing      import Callable, Union
+from collections import OrderedDict, deque
+import threading
+
+## TopicRing
+# Bounded queue of the encoded frames of a single topic. Grows with the frames it keeps, so an idle topic only costs a few bytes.
+class TopicRing:
+    def __init__(self,
+                 capacity : int) -> None:
+        ## Maximum number of frames kept
+        self._capacity    = capacity
+
+        ## Sequence number and frame pairs, oldest first
+        self._frame_list  = deque()
+
+        ## Sequence number of the newest evicted frame. 0 if nothing has been evicted.
+        self._evicted_seq = 0
+
+        ## Total length of the frames in the ring
+        self._byte_count  = 0
+
+    ## Gets the number of frames in the ring.
+    def __len__(self) -> int:
+        return len(self._frame_list)
+
+    ## Gets the capacity of the ring.
+    def get_capacity(self) -> int:
+        return self._capacity
+
+    ## Gets the total length of the frames in the ring.
+    def get_byte_count(self) -> int:
+        return self._byte_count
+
+    ## Gets the sequence number of the oldest frame in the ring. Returns 0 if the ring is empty.
+    def get_first_seq(self) -> int:
+        return self._frame_list[0][0] if self._frame_list else 0
+
+    ## Gets the sequence number of the newest frame in the ring. Returns 0 if the ring is empty.
+    def get_last_seq(self) -> int:
+        return self._frame_list[-1][0] if self._frame_list else 0
+
+    ## Gets the sequence number of the newest evicted frame. Returns 0 if nothing has been evicted.
+    def get_evicted_seq(self) -> int:
+        return self._evicted_seq
+
+    ## Appends the frame to the ring. Oldest frame will be evicted if the ring is full.
+    # @param seq Sequence number of the frame. Must be bigger than the sequence numbers of the frames in the ring.
+    # @param frame Encoded frame.
+    def append(self,
+               seq   : int,
+               frame : bytes) -> None:
+        if len(self._frame_list) == self._capacity:
+            self.evict()
+
+        self._frame_list.append((seq, frame))
+        self._byte_count += len(frame)
+
+    ## Evicts the oldest frame in the ring. Returns the length of the evicted frame.
+    def evict(self) -> int:
+        if not self._frame_list:
+            return 0
+
+        seq, frame = self._frame_list.popleft()
+
+        self._evicted_seq = seq
+        self._byte_count -= len(frame)
+
+        return len(frame)
+
+    ## Gets the frames which sequence numbers are bigger than seq, oldest first.
+    # @param seq Sequence number of the last frame the client has received.
+    def get_since(self,
+                  seq : int) -> list:
+        frame_list = []
+
+        for frame_seq, frame in reversed(self._frame_list):
+            if frame_seq <= seq:
+                break
+
+            frame_list.append(frame)
+
+        frame_list.reverse()
+
+        return frame_list
+
+## ReplayBuffer
+# History store that keeps the latest encoded frames of each topic so reconnecting clients can catch up.
+# Memory is capped per topic (frame count and bytes) and in total. When the total cap is exceeded,
+# oldest frames of the least recently published topic are evicted first, and a topic is dropped once all of it's frames are evicted.
+# Sequence numbers are shared by all topics and always increase, so a dropped topic never reuses a sequence number a client has seen.
+class ReplayBuffer:
+    ## Constructor of ReplayBuffer.
+    # @param frames_per_topic Maximum number of frames kept for each topic.
+    # @param max_bytes_per_topic Maximum total length of the frames kept for each topic.
+    # @param max_total_bytes Maximum total length of the frames kept for all topics.
+    def __init__(self,
+                 frames_per_topic    : int = 256,
+                 max_bytes_per_topic : int = 1048576,
+                 max_total_bytes     : int = 67108864) -> None:
+        if frames_per_topic    < 1: raise ValueError("frames_per_topic must be at least 1.")
+        if max_bytes_per_topic < 1: raise ValueError("max_bytes_per_topic must be at least 1.")
+        if max_total_bytes     < 1: raise ValueError("max_total_bytes must be at least 1.")
+
+        self._frames_per_topic    = frames_per_topic
+        self._max_bytes_per_topic = max_bytes_per_topic
+        self._max_total_bytes     = max_total_bytes
+
+        # Topics ordered from least recently published to most recently published.
+        self._topic_list  = OrderedDict()
+        self._next_seq    = 1
+        self._byte_count  = 0
+        self._evict_count = 0
+        self._lock        = threading.Lock()
+
+        ## Sequence number of the newest frame evicted from a dropped topic
+        self._dropped_seq = 0
+
+    ## Evicts the oldest frame of the topic's ring and drops the topic if it becomes empty. Must be called while holding the lock.
+    # @param topic Topic of the ring.
+    # @param ring Ring of the topic.
+    def _evict(self,
+               topic : str,
+               ring  : TopicRing) -> None:
+        self._byte_count  -= ring.evict()
+        self._evict_count += 1
+
+        if len(ring) == 0:
+            self._dropped_seq = max(self._dropped_seq, ring.get_evicted_seq())
+            del self._topic_list[topic]
+
+    ## Appends an encoded frame to the topic's history.
+    # @param topic Topic of the frame.
+    # @param frame Encoded frame, or a callable that receives the sequence number given to the frame and returns the encoded frame.
+    # Returns the sequence number given to the frame.
+    # @note Frames longer than max_bytes_per_topic are given a sequence number but they are not kept.
+    def append(self,
+               topic : str,
+               frame : Union[bytes, Callable[[int], bytes]]) -> int:
+        with self._lock:
+            seq             = self._next_seq
+            self._next_seq += 1
+
+            if callable(frame):
+                frame = frame(seq)
+
+            ring = self._topic_list.get(topic)
+
+            if ring is None:
+                ring = self._topic_list[topic] = TopicRing(self._frames_per_topic)
+            else:
+                self._topic_list.move_to_end(topic)
+
+            if len(ring) == ring.get_capacity():
+                self._evict_count += 1
+
+            ring_byte_count   = ring.get_byte_count()
+            ring.append(seq, frame)
+            self._byte_count += ring.get_byte_count() - ring_byte_count
+
+            # Per topic cap
+            while ring.get_byte_count() > self._max_bytes_per_topic:
+                self._evict(topic, ring)
+
+            # Total cap
+            while self._byte_count > self._max_total_bytes:
+                lru_topic, lru_ring = next(iter(self._topic_list.items()))
+                self._evict(lru_topic, lru_ring)
+
+            return seq
+
+    ## Gets the frames of the topic which sequence numbers are bigger than seq, oldest first.
+    # @param topic Topic of the frames.
+    # @param seq Sequence number of the last frame the client has received. Pass 0 to get all kept frames.
+    # @note Frames that have been evicted are skipped. Use ReplayBuffer.has_gap to detect it.
+    def get_since(self,
+                  topic : str,
+                  seq   : int) -> list:
+        with self._lock:
+            ring = self._topic_list.get(topic)
+
+            if ring is None:
+                return []
+
+            return ring.get_since(seq)
+
+    ## Gets whether any frame of the topic published after seq has been evicted, so ReplayBuffer.get_since can't return all of the missed frames.
+    # @param topic Topic of the frames.
+    # @param seq Sequence number of the last frame the client has received.
+    # @note Once a topic is dropped, it's evicted frames can't be told apart from the other dropped topics', so the result may be True for a topic that has no gap.
+    def has_gap(self,
+                topic : str,
+                seq   : int) -> bool:
+        with self._lock:
+            ring = self._topic_list.get(topic)
+
+            if seq < self._dropped_seq:
+                return True
+
+            return ring is not None and seq < ring.get_evicted_seq()
+
+    ## Gets the sequence numbers of the oldest and the newest frame kept for the topic as a tuple. If no frames are kept, (0, 0) is returned.
+    # @param topic Topic of the frames.
+    def get_seq_range(self,
+                      topic : str) -> tuple:
+        with self._lock:
+            ring = self._topic_list.get(topic)
+
+            if ring is None:
+                return (0, 0)
+
+            return (ring.get_first_seq(), ring.get_last_seq())
+
+    ## Removes the topic and all of it's frames.
+    # @param topic Topic that will be removed.
+    def remove_topic(self,
+                     topic : str) -> None:
+        with self._lock:
+            ring = self._topic_list.pop(topic, None)
+
+            if ring is not None:
+                self._byte_count -= ring.get_byte_count()
+
+    ## Gets the number of topics, frames, bytes and evictions of the buffer.
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "topics"    : len(self._topic_list),
+                "frames"    : sum(len(ring) for ring in self._topic_list.values()),
+                "bytes"     : self._byte_count,
+                "evictions" : self._evict_count
+            }
@@ -0,0 +1,109 @@
+"""
+    Author: Ege Bilecen
+"""
+
+from typing import Union
+import re
+
+from . import custom_types
+from . import exceptions
+
+## Route
+# A path pattern and the handlers that will be used for the clients connected through it.
+class Route:
+    ## Names of the handlers that can be set per route.
+    HANDLER_NAME_LIST = ("client_connect", "client_disconnect", "client_data")
+
+    ## Constructor of Route.
+    # @param handler_list Dictionary of handler name and callback function pairs. See Route.HANDLER_NAME_LIST for available handler names.
+    # @param pattern Path, path prefix or regular expression depending on route_type.
+    # @param route_type How pattern is matched against the request path. See custom_types.RouteType.
+    # @warning Raises KeyError exception if a handler name is unknown. Raises exceptions.INVALID_METHOD exception if a handler is not callable.
+    def __init__(self,
+                 handler_list : dict,
+                 pattern      : Union[str, "re.Pattern"] = "",
+                 route_type   : int = custom_types.RouteType.EXACT) -> None:
+        for handler_name, func in handler_list.items():
+            if handler_name not in Route.HANDLER_NAME_LIST:
+                raise KeyError("\"{}\" is not a route handler.".format(handler_name))
+
+            if func is not None and not callable(func):
+                raise exceptions.INVALID_METHOD("Handler \"{}\" is not callable.".format(handler_name))
+
+        if route_type not in (custom_types.RouteType.EXACT, custom_types.RouteType.PREFIX, custom_types.RouteType.REGEX):
+            raise ValueError("Unknown route type {}.".format(route_type))
+
+        self._pattern    = pattern
+        self._route_type = route_type
+        self._regex      = re.compile(pattern) if route_type == custom_types.RouteType.REGEX else None
+
+        ## Handlers of the route. Missing handlers are set to None.
+        self.client_connect    = handler_list.get("client_connect")
+        self.client_disconnect = handler_list.get("client_disconnect")
+        self.client_data       = handler_list.get("client_data")
+
+    ## Gets the pattern of route.
+    def get_pattern(self) -> str:
+        return self._pattern if self._regex is None else self._regex.pattern
+
+    ## Gets the type of route.
+    def get_route_type(self) -> int:
+        return self._route_type
+
+## Router
+# Precompiled table of routes. Exact routes are looked up from a dictionary, then regular expression routes are tried
+# in the order they were added, then the longest matching prefix route is used.
+class Router:
+    def __init__(self) -> None:
+        self._exact_route_list  = {}
+        self._regex_route_list  = []
+        self._prefix_route_list = []
+
+    ## Gets whether any route has been added.
+    def __bool__(self) -> bool:
+        return bool(self._exact_route_list or self._regex_route_list or self._prefix_route_list)
+
+    ## Adds the route to the table.
+    # @param route Route that will be added.
+    def add_route(self,
+                  route : Route) -> None:
+        route_type = route.get_route_type()
+
+        if   route_type == custom_types.RouteType.EXACT:
+            self._exact_route_list[route.get_pattern()] = route
+        elif route_type == custom_types.RouteType.REGEX:
+            self._regex_route_list.append(route)
+        else:
+            self._prefix_route_list.append(route)
+            # Longest prefix first
+            self._prefix_route_list.sort(key=lambda elem: len(elem.get_pattern()), reverse=True)
+
+    ## Finds the route of the path. Returns the route and captured parameters as a tuple, or None if no route matches.
+    # @param path Request path without the query string.
+    # @note Named groups of regular expression routes are returned as dictionary, positional groups are added with their index as key.
+    # @note Prefix routes match on path segment boundaries. "/chat" matches "/chat" and "/chat/room" but not "/chatroom".
+    def resolve(self,
+                path : str) -> tuple:
+        route = self._exact_route_list.get(path)
+
+        if route is not None:
+            return route, {}
+
+        for route in self._regex_route_list:
+            match = route._regex.fullmatch(path)
+
+            if match is not None:
+                path_params = {i : group for i, group in enumerate(match.groups(), 1)}
+                path_params.update(match.groupdict())
+
+                return route, path_params
+
+        for route in self._prefix_route_list:
+            pattern     = route.get_pattern()
+            pattern_len = len(pattern)
+
+            if  path.startswith(pattern) \
+            and (len(path) == pattern_len or pattern.endswith("/") or path[pattern_len] == "/"):
+                return route, {}
+
+        return None
@@ -0,0 +1,520 @@
+"""
+    Author: Ege Bilecen
+"""
+
+from typing      import Iterator
+from collections import deque
+from itertools   import islice
+import os
+import selectors
+import socket
+import threading
+import time
+
+from . import custom_types
+from . import exceptions
+
+## Maximum number of buffers that can be passed to a single sendmsg call.
+try:
+    IOV_MAX = os.sysconf("SC_IOV_MAX")
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = 1024
+
+if IOV_MAX <= 0:
+    IOV_MAX = 1024
+
+## Flag of a send call that returns instead of blocking when socket's send buffer is full. None if the system doesn't support it.
+MSG_DONTWAIT = getattr(socket, "MSG_DONTWAIT", None)
+
+## SendItem
+# A queued message. It is a sequence of units where each unit is a list of buffers written with a single (vectored) write.
+class SendItem:
+    def __init__(self,
+                 unit_iter  : Iterator[list],
+                 is_closing : bool = False) -> None:
+        ## Iterator of the units that haven't been taken yet
+        self._unit_iter  = unit_iter
+
+        ## Unit that will be written next. None if all units are written.
+        self._next_unit  = next(unit_iter, None)
+
+        ## Is any unit of the item written?
+        self._is_started = False
+
+        ## Is item completely written or failed?
+        self._is_done    = False
+
+        ## Will connection be closed after this item is written?
+        self._is_closing = is_closing
+
+        ## Exception that prevented the item from being written
+        self._error      = None
+
+        ## Is a sender waiting for the item to be written? Items queued with SendScheduler.post have no waiting sender.
+        self._is_waited  = True
+
+## SendScheduler
+# Serializes the writes to a client's socket and orders them by priority.
+# Control frames are written first, then high priority messages and then bulk messages. A bulk message that is
+# being written can only be preempted by control frames at unit (fragment) boundaries, as RFC6455 doesn't allow
+# frames of another data message to be sent between the fragments of a message.
+# The thread that finds the socket idle becomes the writer; other senders wait for their item to be written and
+# take over the writer role when the current writer is done with it's own item. Items queued with SendScheduler.post
+# have no waiting sender. A thread writes them until the socket's send buffer is full or it has written FLUSH_UNIT_COUNT units,
+# then passes the writer role to the SendPump, so no thread is held by a slow socket or by a steady stream of posted items.
+class SendScheduler:
+    ## Number of units a thread writes without blocking before the rest is passed to the SendPump.
+    FLUSH_UNIT_COUNT = 64
+
+    ## Maximum number of posted items that can be queued. SendScheduler.post raises exceptions.SEND_QUEUE_FULL beyond it.
+    MAX_POSTED_COUNT = 16384
+
+    ## Constructor of SendScheduler.
+    # @param socket Socket that will be written to.
+    # @param pump Pump that writes the posted items which can't be written right away. If set to None, they are written with blocking writes.
+    def __init__(self,
+                 socket : socket.socket,
+                 pump   : "SendPump" = None) -> None:
+        self._socket     = socket
+        self._pump       = pump if MSG_DONTWAIT is not None else None
+        self._queue_list = (deque(), deque(), deque())
+        self._condition  = threading.Condition()
+        self._is_writing = False
+        self._is_closed  = False
+        self._error      = None
+
+        ## Item whose current unit has been partially written. Nothing else can be written before the rest of the unit.
+        self._partial_item = None
+
+        ## Number of queued items that have been posted
+        self._posted_count = 0
+
+    ## Writes the buffers with a single vectored write if possible. Lists longer than IOV_MAX are written in chunks of IOV_MAX buffers.
+    # Returns the part of the buffers that hasn't been written. It is only non-empty if is_blocking is False and socket's send buffer is full.
+    # @param buffer_list List of bytes-like objects.
+    # @param is_blocking If set to False, returns instead of waiting when socket's send buffer is full.
+    def _write(self,
+               buffer_list : list,
+               is_blocking : bool = True) -> list:
+        flags = 0 if is_blocking else MSG_DONTWAIT
+
+        if not hasattr(self._socket, "sendmsg"):
+            buffer_list = [b"".join(buffer_list)] if len(buffer_list) > 1 else buffer_list
+
+        buffer_list = deque(memoryview(buffer).cast("B") for buffer in buffer_list)
+
+        while buffer_list:
+            try:
+                if len(buffer_list) == 1:
+                    sent_len = self._socket.send(buffer_list[0], flags)
+                else:
+                    sent_len = self._socket.sendmsg(list(islice(buffer_list, IOV_MAX)), (), flags)
+            except BlockingIOError:
+                return list(buffer_list)
+
+            # Drop the buffers that have been sent completely and slice the partially sent one.
+            while buffer_list and sent_len >= len(buffer_list[0]):
+                sent_len -= len(buffer_list.popleft())
+
+            if buffer_list and sent_len:
+                buffer_list[0] = buffer_list[0][sent_len:]
+
+        return []
+
+    ## Gets the item whose next unit will be written. Must be called while holding the condition's lock.
+    def _get_next_item(self) -> SendItem:
+        control_queue, high_queue, bulk_queue = self._queue_list
+
+        # Rest of a partially written unit must be written before anything else.
+        if self._partial_item is not None:
+            return self._partial_item
+
+        if control_queue:
+            return control_queue[0]
+
+        # Fragments of a started message can't be interleaved with other data messages.
+        if bulk_queue and bulk_queue[0]._is_started:
+            return bulk_queue[0]
+
+        if high_queue:
+            return high_queue[0]
+
+        if bulk_queue:
+            return bulk_queue[0]
+
+        return None
+
+    ## Marks all queued items as failed. Must be called while holding the condition's lock.
+    # @param error Exception that caused the failure.
+    def _fail_all(self,
+                  error : Exception) -> None:
+        self._is_closed     = True
+        self._error         = error
+        self._posted_count  = 0
+
+        for queue in self._queue_list:
+            for item in queue:
+                item._is_done = True
+                item._error   = error
+
+            queue.clear()
+
+        self._condition.notify_all()
+
+    ## Writes the queued items until own_item is written, then hands the writer role over to a waiting sender.
+    # Returns True if the writer role has been given up. Returns False if the caller still holds it because the socket's send buffer is full,
+    # unit_count units have been written or own_item is written and posted items are left. Caller must then call SendScheduler._drain again
+    # (such as when socket becomes writable) or pass the role to the pump with SendScheduler._pass_rest.
+    # @param own_item Item of the calling thread. If set to None, queued items are written until an item with a waiting sender is reached.
+    # @param is_blocking If set to False, returns instead of waiting when socket's send buffer is full.
+    # @param unit_count Maximum number of units that will be written. If set to None, there is no limit.
+    def _drain(self,
+               own_item    : SendItem = None,
+               is_blocking : bool     = True,
+               unit_count  : int      = None) -> bool:
+        while True:
+            with self._condition:
+                item = self._get_next_item() if not self._is_closed else None
+
+                if item is None \
+                or ((own_item is None or own_item._is_done) and item._is_waited):
+                    self._is_writing = False
+                    self._condition.notify_all()
+                    return True
+
+                # Posted items left behind by a sender are written by the pump, so the sender isn't held by them.
+                if own_item is not None and own_item._is_done:
+                    return False
+
+                if unit_count is not None:
+                    if unit_count == 0:
+                        return False
+
+                    unit_count -= 1
+
+                item._is_started = True
+                unit             = item._next_unit
+
+            try:
+                unwritten_list = self._write(unit, is_blocking)
+
+                if not unwritten_list:
+                    item._next_unit = next(item._unit_iter, None)
+            except Exception as ex:
+                with self._condition:
+                    item._is_done = True
+                    item._error   = ex
+                    self._is_writing = False
+                    self._fail_all(ex)
+                return True
+
+            with self._condition:
+                if unwritten_list:
+                    item._next_unit    = unwritten_list
+                    self._partial_item = item
+                    return False
+
+                self._partial_item = None
+
+                if item._next_unit is None:
+                    for queue in self._queue_list:
+                        if queue and queue[0] is item:
+                            queue.popleft()
+                            break
+
+                    if not item._is_waited:
+                        self._posted_count -= 1
+
+                    item._is_done = True
+                    self._condition.notify_all()
+
+                    if item._is_closing:
+                        self._fail_all(exceptions.SOCKET_CLOSED("Connection has been closed."))
+
+    ## Passes the writer role to the pump, which writes the rest of the queued items when the socket becomes writable.
+    # Writes them with blocking writes if there is no pump or it has been stopped. Caller must hold the writer role.
+    def _pass_rest(self) -> None:
+        if self._pump is None or not self._pump.add(self):
+            self._drain()
+
+    ## Fails the queued items and shuts the socket down without waiting for the writer, so the connection's own thread
+    # notices it and closes the connection. Used to drop a client that doesn't read what is sent to it.
+    # @param error Exception that the queued items fail with.
+    def abort(self,
+              error : Exception) -> None:
+        with self._condition:
+            if self._is_closed:
+                return
+
+            self._fail_all(error)
+
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    ## Gives up the writer role without writing. Queued items are written by the next writer.
+    def _release_writer_role(self) -> None:
+        with self._condition:
+            self._is_writing = False
+            self._condition.notify_all()
+
+    ## Queues the units and blocks until they are written.
+    # @param unit_iter Iterator of the units. Each unit is a list of buffers that will be written with a single write.
+    # @param priority Priority class of the item. See custom_types.SendPriority.
+    # @param is_closing If set to True, nothing will be written after this item.
+    # @warning Raises exceptions.SOCKET_CLOSED exception if the connection is closed or the write fails.
+    def send(self,
+             unit_iter  : Iterator[list],
+             priority   : int  = custom_types.SendPriority.BULK,
+             is_closing : bool = False) -> None:
+        item = SendItem(unit_iter, is_closing)
+
+        if item._next_unit is None:
+            return
+
+        with self._condition:
+            if self._is_closed:
+                raise exceptions.SOCKET_CLOSED("Connection is closed.") from self._error
+
+            self._queue_list[priority].append(item)
+
+            # Pump gives up the writer role when it reaches the item, instead of when the socket becomes writable.
+            if self._is_writing and self._pump is not None:
+                self._pump.wakeup(self)
+
+            while self._is_writing and not item._is_done:
+                self._condition.wait()
+
+            if not item._is_done:
+                self._is_writing = True
+
+        if not item._is_done and not self._drain(item):
+            self._pass_rest()
+
+        if item._error is not None:
+            raise exceptions.SOCKET_CLOSED("Couldn't send data to socket. ({})".format(str(item._error))) from item._error
+
+    ## Queues the units without waiting for them to be written. Units are written by the thread that holds the writer role
+    # or by the next call to SendScheduler.flush, and they are written in the order they are queued in their priority class.
+    # @param unit_iter Iterator of the units. Each unit is a list of buffers that will be written with a single write.
+    # @param priority Priority class of the item. See custom_types.SendPriority.
+    # @warning Raises exceptions.SOCKET_CLOSED exception if the connection is closed and exceptions.SEND_QUEUE_FULL exception if
+    # MAX_POSTED_COUNT posted items are already queued. Errors of the write itself aren't reported to the caller.
+    def post(self,
+             unit_iter : Iterator[list],
+             priority  : int = custom_types.SendPriority.BULK) -> None:
+        item = SendItem(unit_iter)
+        item._is_waited = False
+
+        if item._next_unit is None:
+            return
+
+        with self._condition:
+            if self._is_closed:
+                raise exceptions.SOCKET_CLOSED("Connection is closed.") from self._error
+
+            if self._posted_count >= SendScheduler.MAX_POSTED_COUNT:
+                raise exceptions.SEND_QUEUE_FULL("Send queue of the connection is full.")
+
+            self._queue_list[priority].append(item)
+            self._posted_count += 1
+
+    ## Takes the writer role if no other thread holds it. Returns False if another thread holds it or scheduler is closed.
+    def _acquire_writer_role(self) -> bool:
+        with self._condition:
+            if self._is_writing or self._is_closed:
+                return False
+
+            self._is_writing = True
+
+            return True
+
+    ## Writes the queued items if no other thread holds the writer role. Returns immediately otherwise, as the writer will write them.
+    # Without blocking, at most FLUSH_UNIT_COUNT units are written before the rest is passed to the pump.
+    def flush(self) -> None:
+        if not self._acquire_writer_role():
+            return
+
+        if self._pump is None:
+            self._drain()
+        elif not self._drain(None, False, SendScheduler.FLUSH_UNIT_COUNT):
+            self._pass_rest()
+
+    ## Queues the buffers as a single unit and blocks until they are written.
+    # @param buffer_list List of buffers (such as encoded frames) that will be written with a single write.
+    # @param priority Priority class of the item. See custom_types.SendPriority.
+    # @param is_closing If set to True, nothing will be written after this item.
+    def send_buffers(self,
+                     buffer_list : list,
+                     priority    : int  = custom_types.SendPriority.BULK,
+                     is_closing  : bool = False) -> None:
+        self.send(iter([buffer_list]), priority, is_closing)
+
+    ## Gets the number of queued items for each priority class.
+    def get_queue_length_list(self) -> list:
+        with self._condition:
+            return [len(queue) for queue in self._queue_list]
+
+    ## Gets whether scheduler is closed.
+    def get_is_closed(self) -> bool:
+        return self._is_closed
+
+## SendPump
+# Writes the posted items of the sockets whose send buffers are full, so the threads that post them don't wait for slow clients.
+# A single thread waits for all such sockets in a shared selector (epoll on Linux) and writes to each one as it becomes writable.
+# It holds the writer role of the schedulers passed to it until their posted items are written or a sender is waiting for the role.
+class SendPump:
+    def __init__(self) -> None:
+        self._scheduler_list = set()
+        self._pending_list   = deque()
+        self._lock           = threading.Lock()
+        self._selector       = None
+        self._thread         = None
+        self._wakeup_read    = None
+        self._wakeup_write   = None
+        self._is_running     = False
+        self._is_stopped     = False
+
+    ## Starts the pump thread.
+    def _start(self) -> None:
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_read, self._wakeup_write = socket.socketpair()
+        self._wakeup_read.setblocking(False)
+        self._wakeup_write.setblocking(False)
+        self._selector.register(self._wakeup_read, selectors.EVENT_READ)
+
+        self._is_running = True
+        self._thread     = threading.Thread(target=self._run, args=(self._selector, self._wakeup_read, self._wakeup_write))
+        self._thread.daemon = True
+        self._thread.start()
+
+    ## Wakes up the pump thread so it processes the pending list. Must be called while holding the lock.
+    def _wakeup(self) -> None:
+        try:
+            self._wakeup_write.send(b"\x00")
+        except BlockingIOError:
+            # Thread already has pending wake ups.
+            pass
+
+    ## Writes to the scheduler's socket until it's send buffer is full. Registers the socket if it isn't done. Called from the pump thread.
+    # @param selector Selector of the pump thread.
+    # @param scheduler Scheduler whose writer role is held by the pump.
+    def _pump(self,
+              selector  : selectors.BaseSelector,
+              scheduler : SendScheduler) -> None:
+        if not scheduler._drain(None, False, SendScheduler.FLUSH_UNIT_COUNT):
+            try:
+                selector.register(scheduler._socket, selectors.EVENT_WRITE, scheduler)
+            except KeyError:
+                # Already registered, it's written to again when it becomes writable.
+                return
+            except (ValueError, OSError):
+                # Socket has been closed, writing fails right away and gives up the writer role.
+                scheduler._drain()
+            else:
+                return
+
+        with self._lock:
+            self._scheduler_list.discard(scheduler)
+
+        try:
+            selector.unregister(scheduler._socket)
+        except (KeyError, ValueError):
+            pass
+
+    ## Loop of the pump thread. All selector modifications are made in this thread.
+    # @param selector Selector of the thread. Passed in so a later SendPump._start can't replace it under the running thread.
+    # @param wakeup_read Read end of the wake up socket pair.
+    # @param wakeup_write Write end of the wake up socket pair.
+    def _run(self,
+             selector     : selectors.BaseSelector,
+             wakeup_read  : socket.socket,
+             wakeup_write : socket.socket) -> None:
+        retry_time = time.monotonic()
+
+        while self._is_running:
+            with self._lock:
+                pending_list = [scheduler for scheduler in self._pending_list if scheduler in self._scheduler_list]
+                self._pending_list.clear()
+
+            for scheduler in pending_list:
+                self._pump(selector, scheduler)
+
+            ready_list = selector.select(1.0)
+
+            # Sockets that have been closed in the meantime are never reported, so every socket is retried once in a while.
+            if time.monotonic() - retry_time >= 1.0:
+                retry_time = time.monotonic()
+                ready_list = [(key, None) for key in list(selector.get_map().values())]
+
+            for key, _ in ready_list:
+                if key.fileobj is wakeup_read:
+                    try:
+                        while wakeup_read.recv(4096): pass
+                    except BlockingIOError:
+                        pass
+                    continue
+
+                self._pump(selector, key.data)
+
+        # Writer roles held by the pump would never be given up once the thread exits.
+        with self._lock:
+            scheduler_list = list(self._scheduler_list)
+            self._scheduler_list.clear()
+            self._pending_list.clear()
+
+        for key in list(selector.get_map().values()):
+            selector.unregister(key.fileobj)
+
+        selector.close()
+        wakeup_read.close()
+        wakeup_write.close()
+
+        for scheduler in scheduler_list:
+            scheduler._release_writer_role()
+
+    ## Passes the scheduler's writer role to the pump. Returns False if the pump has been stopped, caller keeps the role then.
+    # @param scheduler Scheduler whose writer role is held by the caller.
+    def add(self,
+            scheduler : SendScheduler) -> bool:
+        with self._lock:
+            if self._is_stopped:
+                return False
+
+            if not self._is_running:
+                self._start()
+
+            self._scheduler_list.add(scheduler)
+            self._pending_list.append(scheduler)
+            self._wakeup()
+
+        return True
+
+    ## Makes the pump write to the scheduler's socket without waiting for it to become writable, if the pump holds it's writer role.
+    # Used when a sender is waiting for the role, so it's handed over as soon as the socket allows.
+    # @param scheduler Scheduler that has a waiting sender.
+    def wakeup(self,
+               scheduler : SendScheduler) -> None:
+        with self._lock:
+            if scheduler in self._scheduler_list:
+                self._pending_list.append(scheduler)
+                self._wakeup()
+
+    ## Gets the number of sockets the pump is writing to.
+    def get_count(self) -> int:
+        return len(self._scheduler_list)
+
+    ## Stops the pump thread. Writer roles held by the pump are given up, so queued items are written by the next writer of each socket.
+    def stop(self) -> None:
+        with self._lock:
+            if self._is_stopped:
+                return
+
+            self._is_stopped = True
+
+            if not self._is_running:
+                return
+
+            self._is_running = False
+            self._wakeup()
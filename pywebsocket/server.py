@@ -2,31 +2,62 @@
     Author: Ege Bilecen
     Available Special Handlers:
     * loop
+    * handshake_auth
     * client_connect
     * client_disconnect
     * client_data
 """
 
-from typing import Callable, Union
+from typing import Callable, Iterator, Union
 from random import randint
 from sys    import maxsize as MAX_UINT_VALUE
+from urllib.parse import parse_qs
+from http.cookies import SimpleCookie, CookieError
 import socket
 import base64
+import copy
 import hashlib
 import struct
 import json
+import logging
+import select
 import threading
 
 from . import custom_types
 from . import exceptions
+from .buffer_pool    import BufferPool
+from .replay_buffer  import ReplayBuffer
+from .send_scheduler import SendScheduler, SendPump
+from .transport      import Transport, TCPTransport
+from .router         import Route, Router
+from .auth_cache     import AuthCache
+from .tracing        import Tracer
+from .hibernator     import Hibernator
+from .log            import log_event
+from .               import log
+
+_server_log    = log.get_logger(custom_types.LogSubsystem.SERVER)
+_handshake_log = log.get_logger(custom_types.LogSubsystem.HANDSHAKE)
+_frame_log     = log.get_logger(custom_types.LogSubsystem.FRAMES)
+_handler_log   = log.get_logger(custom_types.LogSubsystem.HANDLERS)
+_close_log     = log.get_logger(custom_types.LogSubsystem.CLOSE)
+
+DEBUG   = logging.DEBUG
+INFO    = logging.INFO
+WARNING = logging.WARNING
 
 ## WebsocketClient
 # Contains the variables for a client that connected to the server.
 class WebsocketClient:
     def __init__(self, 
-                 id     : int,
-                 socket : socket.socket,
-                 addr   : tuple):
+                 id           : int,
+                 socket       : socket.socket,
+                 addr         : tuple,
+                 path         : str      = "/",
+                 query_string : str      = "",
+                 route        : Route    = None,
+                 path_params  : dict     = None,
+                 send_pump    : SendPump = None):
         ## Socket ID of client
         self._id     = id
 
@@ -36,15 +67,70 @@ class WebsocketClient:
         ## Address tuple of client
         self._addr   = addr
 
+        ## Scheduler that serializes and prioritizes the writes to socket
+        self._send_scheduler = SendScheduler(socket, send_pump)
+
         ## Is sending fragmented message?
         self._is_sending_fragmented_message = False
 
         ## Buffer for fragmented message
         self._fragmented_message_buffer     = bytearray()
 
+        ## Receive buffer taken from server's buffer pool
+        self._recv_buffer = None
+
+        ## Memoryview of the receive buffer
+        self._recv_view   = None
+
+        ## Start index of the unprocessed data in receive buffer
+        self._recv_start  = 0
+
+        ## End index of the unprocessed data in receive buffer
+        self._recv_end    = 0
+
+        ## Topics that client is subscribed to
+        self._topic_list  = set()
+
+        ## Request path of client without the query string
+        self._path         = path
+
+        ## Query string of the request path
+        self._query_string = query_string
+
+        ## Parsed query string. Parsed on first access.
+        self._query        = None
+
+        ## Parameters captured from the request path by the route
+        self._path_params  = path_params if path_params is not None else {}
+
+        ## Route that client has connected through.
+        self._route        = route
+
+        ## Is client sampled for tracing?
+        self._is_traced    = False
+
+        ## Poll object used to wait for data with a timeout. Released when client is hibernated.
+        self._poller       = None
+
+        ## Handlers resolved at handshake time.
+        self._client_connect_handler    = None
+        self._client_disconnect_handler = None
+        self._client_data_handler       = None
+
+        self._set_route(route)
+
         ## Dictionary object to hold data in client.
         self.data    = {}
 
+    ## Sets the route of client and the handlers resolved from it.
+    # @param route Route that client has connected through.
+    def _set_route(self,
+                   route : Route) -> None:
+        self._route                     = route
+        self._client_connect_handler    = route.client_connect    if route is not None else None
+        self._client_disconnect_handler = route.client_disconnect if route is not None else None
+        self._client_data_handler       = route.client_data       if route is not None else None
+
     ## Gets the socket ID of client.
     def get_id(self) -> int:
         return self._id
@@ -57,6 +143,10 @@ class WebsocketClient:
     def get_addr(self) -> tuple:
         return self._addr
 
+    ## Gets the send scheduler of client.
+    def get_send_scheduler(self) -> SendScheduler:
+        return self._send_scheduler
+
     ## Get is client sending fragmented message.
     def get_is_sending_fragmented_message(self) -> bool:
         return self._is_sending_fragmented_message
@@ -65,6 +155,29 @@ class WebsocketClient:
     def get_fragmented_message(self) -> bytes:
         return bytes(self._fragmented_message_buffer)
 
+    ## Gets the topics that client is subscribed to.
+    def get_topic_list(self) -> list:
+        return list(self._topic_list)
+
+    ## Gets the request path of client without the query string.
+    def get_path(self) -> str:
+        return self._path
+
+    ## Gets the parameters captured from the request path by a regular expression route.
+    def get_path_params(self) -> dict:
+        return self._path_params
+
+    ## Gets the parsed query string as dictionary of lists. It is parsed once and cached.
+    def get_query(self) -> dict:
+        if self._query is None:
+            self._query = parse_qs(self._query_string)
+
+        return self._query
+
+    ## Gets the route that client has connected through. If server has no routes, it is the default route made of server's special handlers.
+    def get_route(self) -> Route:
+        return self._route
+
 ## WebsocketServer
 # Simple Websocket Server.
 class WebsocketServer:
@@ -77,131 +190,395 @@ class WebsocketServer:
     ## Supported websocket version by server.
     WEBSOCKET_VERSION = 13
 
+    ## Number of locks that topics are spread over. Memory used for locks doesn't grow with the number of topics.
+    TOPIC_LOCK_COUNT  = 64
+
     ## Constructor of WebsocketServer.
     # @param ip IP address of the server.
     # @param port Port number that will be used for communication.
     # @param client_buffer_size Buffer size for the data sent from client.
     # @param pass_data_as_string Data sent from client will be passed as UTF-8 string to "client_data" special handler's data param if set to True. Otherwise a byte array will be passed.
     # @param daemon_handshake_handler Determine whether client handshake handler thread to be daemon or not.
-    # @param debug Enable/disable debug messages.
+    # @param debug Print the events of all subsystems to stdout. Logging can also be configured with the standard logging module through "pywebsocket.<subsystem>" loggers. See custom_types.LogSubsystem.
+    # @warning Loggers are shared by all servers, so debug is process-global: it sets "pywebsocket" logger to DEBUG level and prints the events of every server in the process until log.disable_debug_output is called.
+    # @param buffer_pool Pool that receive buffers will be taken from. If set to None, a pool which smallest size class is client_buffer_size will be created.
+    # @param replay_buffer History store for the frames published to topics. If set to None, a ReplayBuffer with default limits will be created.
+    # @param send_fragment_size Messages longer than this will be sent as fragments of this size, so control frames can be sent between them.
+    # @param transport Transport that connections will be accepted from. If set to None, a TCPTransport bound to ip and port will be used.
+    # @param handshake_auth_cache If not None, results of "handshake_auth" special handler will be cached in it and reused for every request with the same cache key.
+    # @param tracer Tracer that creates spans around handshake, decode, handler and send of sampled connections. If set to None, tracing will be disabled.
+    # @param hibernate_after Number of seconds a client can stay idle before it's thread and receive buffer are released and it's socket is parked until data arrives. If set to None, clients will never be hibernated.
+    # @param max_frame_size Maximum payload length of a frame sent from client. Connection is closed with status code 1009 if a longer frame is announced, before any buffer is allocated for it.
+    # @param max_message_size Maximum total length of a fragmented message sent from client. Connection is closed with status code 1009 if it is exceeded.
     def __init__(self,
-                 ip                       : str  = "",
-                 port                     : int  = 3630,
-                 client_buffer_size       : int  = 2048,
-                 pass_data_as_string      : bool = False,
-                 daemon_handshake_handler : bool = False,
-                 debug                    : bool = False) -> None:
+                 ip                       : str          = "",
+                 port                     : int          = 3630,
+                 client_buffer_size       : int          = 2048,
+                 pass_data_as_string      : bool         = False,
+                 daemon_handshake_handler : bool         = False,
+                 debug                    : bool         = False,
+                 buffer_pool              : BufferPool   = None,
+                 replay_buffer            : ReplayBuffer = None,
+                 send_fragment_size       : int          = 65536,
+                 transport                : Transport    = None,
+                 handshake_auth_cache     : AuthCache    = None,
+                 tracer                   : Tracer       = None,
+                 hibernate_after          : float        = None,
+                 max_frame_size           : int          = 16777216,
+                 max_message_size         : int          = 67108864) -> None:
         # Server Variables
-        self._server                   = None
         self._ip                       = ip
         self._port                     = port
         self._addr                     = (self._ip, self._port)
+        self._transport                = transport if transport is not None else TCPTransport(ip, port)
         self._thread_list              = {}
         self._is_running               = False
         self._pass_data_as_string      = pass_data_as_string
         self._daemon_handshake_handler = daemon_handshake_handler
         self._debug                    = debug
+        self._tracer                   = tracer if tracer is not None else Tracer()
+
+        if self._debug:
+            log.enable_debug_output()
 
         # Client Variables
         self._client_socket_list = {}
         self._client_thread_list = {}
         self._client_buffer_size = client_buffer_size
+        self._hibernate_after    = hibernate_after
+        self._hibernator         = Hibernator(self._revive_client, self._close_hibernated_client)
+        self._send_pump          = SendPump()
+
+        if hibernate_after is not None and hibernate_after <= 0:
+            raise ValueError("hibernate_after must be bigger than 0.")
+
+        if max_frame_size   <= 0: raise ValueError("max_frame_size must be bigger than 0.")
+        if max_message_size <= 0: raise ValueError("max_message_size must be bigger than 0.")
+
+        self._max_frame_size   = max_frame_size
+        self._max_message_size = max_message_size
+
+        if buffer_pool is None:
+            buffer_pool = BufferPool([client_buffer_size] + [size for size in BufferPool.DEFAULT_SIZE_CLASSES if size > client_buffer_size])
+
+        self._buffer_pool        = buffer_pool
+        self._send_fragment_size = send_fragment_size
+
+        # Topic Variables
+        self._topic_list      = {}
+        self._topic_lock_list = tuple(threading.Lock() for _ in range(WebsocketServer.TOPIC_LOCK_COUNT))
+        self._replay_buffer   = replay_buffer if replay_buffer is not None else ReplayBuffer()
 
         # Handler Variables
+        self._router               = Router()
         self._special_handler_list = {
             "loop"              : None,
+            "handshake_auth"    : None,
             "client_connect"    : None,
             "client_disconnect" : None,
             "client_data"       : None
         }
+        self._default_route        = Route({})
+        self._handshake_auth_cache = handshake_auth_cache
 
     """
         --- Private Method(s)
     """
     ## Function that will handle data sent from client.
     # @param socket_id Client's given socket ID after sucessful handshake.
+    # @param is_revived Is client revived from hibernation? "client_connect" handler isn't called for revived clients.
     @staticmethod
-    def _client_handler(cls       : "WebsocketServer",
-                        socket_id : int) -> None:
-        LOG_TITLE = "_client_handler() - [Socket ID: {}]".format(socket_id)
+    def _client_handler(cls        : "WebsocketServer",
+                        socket_id  : int,
+                        is_revived : bool = False) -> None:
+        client          = cls._client_socket_list[socket_id]
+        tracer          = cls._tracer
+        is_traced       = client._is_traced
+        hibernate_after = cls._hibernate_after
 
-        cls._print_log(LOG_TITLE, "A new thread has been started for the socket.")
-        client        = cls._client_socket_list[socket_id]
-        client_socket = client.get_socket()
+        if _handler_log.isEnabledFor(DEBUG):
+            log_event(_handler_log, DEBUG, "A new thread has been started for the socket.", socket_id=socket_id, is_revived=is_revived)
+
+        close_status_code = 1000
+
+        if  not is_revived \
+        and client._client_connect_handler is not None:
+            if _handler_log.isEnabledFor(DEBUG):
+                log_event(_handler_log, DEBUG, "Calling \"client_connect\" handler for the socket.", socket_id=socket_id)
 
-        if cls._special_handler_list["client_connect"] is not None:
-            cls._print_log(LOG_TITLE, "Calling \"client_connect\" special handler for the socket.")
-            cls._special_handler_list["client_connect"](cls, client)
+            client._client_connect_handler(cls, client)
 
         while cls._is_running \
         and   cls._client_thread_list[socket_id]["status"] == 1:
-            data = client_socket.recv(cls._client_buffer_size)
+            # Hibernate if nothing arrives for a while. Clients in the middle of a frame or a fragmented message are never hibernated.
+            if  hibernate_after is not None \
+            and client._recv_start == client._recv_end \
+            and not client._is_sending_fragmented_message \
+            and not WebsocketServer._wait_readable(client, hibernate_after):
+                # Hibernator may have been stopped with the server while waiting.
+                if not cls._is_running:
+                    break
+
+                WebsocketServer._hibernate_client(cls, client)
+                return
+
+            try:
+                decoded_packet = WebsocketServer._receive_packet(cls, client)
+            except exceptions.CLOSE_CONNECTION:
+                if _close_log.isEnabledFor(INFO):
+                    log_event(_close_log, INFO, "The socket has left from server. (Sent close connection)", socket_id=socket_id)
+                break
+            except exceptions.UNKNOWN_OPCODE:
+                if _close_log.isEnabledFor(INFO):
+                    log_event(_close_log, INFO, "The socket has left from server. (Received unknown OPCODE)", socket_id=socket_id)
+                break
+            except exceptions.MASK_ERROR:
+                if _close_log.isEnabledFor(INFO):
+                    log_event(_close_log, INFO, "The socket has left from server. (Received unmasked frame)", socket_id=socket_id)
+                break
+            except exceptions.MESSAGE_TOO_BIG as ex:
+                if _close_log.isEnabledFor(INFO):
+                    log_event(_close_log, INFO, "Closing the socket. (Received too big frame)", socket_id=socket_id, error=str(ex))
+                close_status_code = 1009
+                break
+            except Exception as ex:
+                if _close_log.isEnabledFor(WARNING):
+                    log_event(_close_log, WARNING, "The socket has left from server. (Unknown exception)", socket_id=socket_id, error=str(ex))
+                break
 
-            if not data:
-                cls._print_log(LOG_TITLE, "The socket has left from server.")
+            if decoded_packet is None:
+                if _close_log.isEnabledFor(INFO):
+                    log_event(_close_log, INFO, "The socket has left from server.", socket_id=socket_id)
                 break
             else:
-                try:
-                    decoded_packet = WebsocketServer._decode_packet(data)
-                    client_data    = decoded_packet["data"]
-                except exceptions.CLOSE_CONNECTION:
-                    cls._print_log(LOG_TITLE, "The socket has left from server. (Sent close connection)")
-                    break
-                except exceptions.UNKNOWN_OPCODE:
-                    cls._print_log(LOG_TITLE, "The socket has left from server. (Received unknown OPCODE)")
-                    break
-                except exceptions.MASK_ERROR:
-                    cls._print_log(LOG_TITLE, "The socket has left from server. (Received unmasked frame)")
-                    break
-                except Exception as ex:
-                    cls._print_log(LOG_TITLE, "The socket has left from server. (UNKNOWN EXCEPTION: {})".format(str(ex)))
-                    break
+                # client_data is a memoryview of the receive buffer and it is only valid until the next packet is received.
+                client_data = decoded_packet["data"]
+
+                if _frame_log.isEnabledFor(DEBUG):
+                    log_event(_frame_log, DEBUG, "Received frame.", socket_id=socket_id, opcode=decoded_packet["OPCODE"], fin=decoded_packet["FIN"], length=len(client_data))
 
                 if decoded_packet["OPCODE"] == custom_types.ControlFrame.PING_FRAME:
-                    cls._print_log(LOG_TITLE, "The socket has sent ping frame. Sending pong frame in response.")
-                    client_socket.send(WebsocketServer._encode_data(client_data, custom_types.ControlFrame.PONG_FRAME))
+                    try:
+                        client.get_send_scheduler().send_buffers([WebsocketServer._encode_data(client_data, custom_types.ControlFrame.PONG_FRAME)],
+                                                                 custom_types.SendPriority.CONTROL)
+                    except exceptions.SOCKET_CLOSED:
+                        break
                     continue
 
+                if  (client._is_sending_fragmented_message or decoded_packet["FIN"] == 0x00) \
+                and len(client._fragmented_message_buffer) + len(client_data) > cls._max_message_size:
+                    if _close_log.isEnabledFor(INFO):
+                        log_event(_close_log, INFO, "Closing the socket. (Received too big fragmented message)", socket_id=socket_id, max_message_size=cls._max_message_size)
+                    close_status_code = 1009
+                    break
+
                 # check if it is fragmented message
                 if  decoded_packet["FIN"]    == 0x00 \
                 and decoded_packet["OPCODE"] != custom_types.FrameType.CONTINUATION_FRAME:
                     client._is_sending_fragmented_message = True
                     client._fragmented_message_buffer.extend(client_data)
-                    cls._print_log(LOG_TITLE, "The socket has initiated a fragmented message.")
                     continue
                 elif decoded_packet["FIN"]    == 0x00 \
                 and  decoded_packet["OPCODE"] == custom_types.FrameType.CONTINUATION_FRAME \
                 and  client.get_is_sending_fragmented_message():
                     client._fragmented_message_buffer.extend(client_data)
-                    cls._print_log(LOG_TITLE, "The socket has sent another fragmented message.")
                     continue
                 elif decoded_packet["FIN"]    == 0x01 \
                 and  decoded_packet["OPCODE"] == custom_types.FrameType.CONTINUATION_FRAME \
                 and  client.get_is_sending_fragmented_message():
                     client._is_sending_fragmented_message = False
                     client._fragmented_message_buffer.extend(client_data)
-                    cls._print_log(LOG_TITLE, "The socket has completed the fragmented message.")
 
                     client_data = client.get_fragmented_message()
                     client._fragmented_message_buffer = bytearray() # clear the buffer
 
-                if client_data == b"": continue
+                if len(client_data) == 0: continue
+
+                if cls._pass_data_as_string: client_data = str(client_data, WebsocketServer.ENCODING_TYPE)
+                else:                        client_data = bytes(client_data)
 
-                cls._print_log(LOG_TITLE, "The socket has sent {} bytes long data.".format(len(client_data)))
+                # Looked up per message as WebsocketServer.set_special_handler can replace it.
+                client_data_handler = client._client_data_handler
 
-                if cls._pass_data_as_string: client_data = client_data.decode(WebsocketServer.ENCODING_TYPE)
+                if client_data_handler is not None:
+                    span = tracer.start_span("handler", socket_id=socket_id, length=len(client_data)) if is_traced else None
 
-                if cls._special_handler_list["client_data"] is not None:
-                    cls._print_log(LOG_TITLE, "Calling \"client_data\" special handler for the socket.")
-                    cls._special_handler_list["client_data"](cls, client, client_data)
+                    client_data_handler(cls, client, client_data)
+
+                    if span is not None: span.end()
         
-        cls._close_client_socket(socket_id)
-        cls._print_log(LOG_TITLE, "The socket's thread has been terminated.")
+        cls._close_client_socket(socket_id, close_status_code)
+        WebsocketServer._release_recv_buffer(cls, client)
+
+        if _handler_log.isEnabledFor(DEBUG):
+            log_event(_handler_log, DEBUG, "The socket's thread has been terminated.", socket_id=socket_id)
 
-    ## Creates handshake from HTTP request of client.
+    ## Waits until client's socket becomes readable. Returns False if timeout expires.
+    # @param client Client whose socket will be waited.
+    # @param timeout Timeout in seconds.
+    @staticmethod
+    def _wait_readable(client  : WebsocketClient,
+                       timeout : float) -> bool:
+        # poll isn't limited by FD_SETSIZE, select is used where poll isn't available (Windows).
+        if hasattr(select, "poll"):
+            if client._poller is None:
+                client._poller = select.poll()
+                client._poller.register(client.get_socket(), select.POLLIN)
+
+            return bool(client._poller.poll(timeout * 1000))
+
+        return bool(select.select([client.get_socket()], [], [], timeout)[0])
+
+    ## Releases the client's thread and buffers and parks it's socket until data arrives. Client's data is kept.
+    # @param client Client that will be hibernated.
+    @staticmethod
+    def _hibernate_client(cls    : "WebsocketServer",
+                          client : WebsocketClient) -> None:
+        WebsocketServer._release_recv_buffer(cls, client)
+
+        client._fragmented_message_buffer = bytearray()
+        client._poller                    = None
+
+        thread_info = cls._client_thread_list.get(client.get_id())
+
+        if thread_info is not None:
+            thread_info["thread"] = None
+
+        if _handler_log.isEnabledFor(DEBUG):
+            log_event(_handler_log, DEBUG, "The socket is hibernated.", socket_id=client.get_id())
+
+        cls._hibernator.park(client)
+
+    ## Starts a new thread for a hibernated client whose socket became readable.
+    # @param client Client that will be revived.
+    def _revive_client(self,
+                       client : WebsocketClient) -> None:
+        socket_id   = client.get_id()
+        thread_info = self._client_thread_list.get(socket_id)
+
+        if thread_info is None:
+            return
+
+        client_thread         = threading.Thread(target=WebsocketServer._client_handler, args=(self, socket_id, True))
+        client_thread.daemon  = True
+        thread_info["thread"] = client_thread
+
+        client_thread.start()
+
+    ## Closes the connection of a hibernated client. Called for each parked client when the hibernator is stopped, and for a client parked after it.
+    # @param client Client whose socket is parked.
+    def _close_hibernated_client(self,
+                                 client : WebsocketClient) -> None:
+        socket_id = client.get_id()
+
+        if socket_id not in self._client_socket_list:
+            return
+
+        try:
+            self._close_client_socket(socket_id, 1001)
+        except Exception as ex:
+            log_event(_close_log, WARNING, "Couldn't close the hibernated socket.", socket_id=socket_id, error=str(ex))
+            return
+
+        if _close_log.isEnabledFor(INFO):
+            log_event(_close_log, INFO, "The hibernated socket has been closed. (Server stopped)", socket_id=socket_id)
+
+    ## Receives a complete frame from client into the client's pooled receive buffer and decodes it.
+    # Returns None if client has closed the connection.
+    # @param client Client that the frame will be received from.
+    # @note Payload of the returned packet is a memoryview of the receive buffer and only valid until the next call.
+    # @warning Raises exceptions.MESSAGE_TOO_BIG exception if the frame's payload is longer than max_frame_size.
+    @staticmethod
+    def _receive_packet(cls    : "WebsocketServer",
+                        client : WebsocketClient) -> dict:
+        client_socket = client.get_socket()
+
+        # Receive buffer is empty, reset indexes and give back the buffer taken for a big frame.
+        if client._recv_start == client._recv_end:
+            client._recv_start = client._recv_end = 0
+
+            if client._recv_buffer is not None \
+            and len(client._recv_buffer) > cls._client_buffer_size:
+                WebsocketServer._release_recv_buffer(cls, client)
+
+        if client._recv_buffer is None:
+            client._recv_buffer = cls._buffer_pool.acquire(cls._client_buffer_size)
+            client._recv_view   = memoryview(client._recv_buffer)
+
+        while True:
+            view      = client._recv_view
+            start     = client._recv_start
+            end       = client._recv_end
+            frame_len = WebsocketServer._get_frame_length(view[start:end], cls._max_frame_size)
+
+            if  frame_len is not None \
+            and end - start >= frame_len:
+                client._recv_start = start + frame_len
+
+                if not client._is_traced:
+                    return WebsocketServer._decode_packet(view[start:start + frame_len])
+
+                span           = cls._tracer.start_span("decode", socket_id=client.get_id(), length=frame_len)
+                decoded_packet = WebsocketServer._decode_packet(view[start:start + frame_len])
+                span.end()
+
+                return decoded_packet
+
+            # 14 bytes is the longest possible header
+            required_len = frame_len if frame_len is not None else 14
+            pending_len  = end - start
+
+            if required_len > len(view):
+                # Frame doesn't fit, move the received part into a bigger buffer from the pool.
+                buffer      = cls._buffer_pool.acquire(required_len)
+                buffer_view = memoryview(buffer)
+                buffer_view[:pending_len] = view[start:end]
+
+                WebsocketServer._release_recv_buffer(cls, client)
+
+                client._recv_buffer = buffer
+                client._recv_view   = view = buffer_view
+                client._recv_start  = 0
+                client._recv_end    = end  = pending_len
+            elif start + required_len > len(view):
+                # Frame doesn't fit into remaining space, move the received part to the beginning.
+                view[:pending_len] = view[start:end]
+                client._recv_start = 0
+                client._recv_end   = end = pending_len
+
+            received_len = client_socket.recv_into(view[end:])
+
+            if received_len == 0:
+                return None
+
+            client._recv_end = end + received_len
+
+    ## Gives the client's receive buffer back to the server's buffer pool.
+    # @param client Client whose receive buffer will be released.
+    @staticmethod
+    def _release_recv_buffer(cls    : "WebsocketServer",
+                             client : WebsocketClient) -> None:
+        if client._recv_buffer is None:
+            return
+
+        client._recv_view.release()
+        cls._buffer_pool.release(client._recv_buffer)
+
+        client._recv_buffer = None
+        client._recv_view   = None
+
+    ## Creates handshake from HTTP request of client and resolves the route of the request path.
+    # Returns a dictionary that contains the handshake response ("response"), parsed request ("http_data"), request path ("path"),
+    # query string ("query_string"), resolved route ("route", None if server's special handlers will be used), path parameters ("path_params")
+    # and the data set by "handshake_auth" special handler ("auth_data").
     # @param http_request HTTP request sent from client.
+    # @param addr Address of the client.
+    # @warning Raises exceptions.HANDSHAKE.ROUTE_NOT_FOUND exception if routes are added and none of them matches the request path.
+    # Raises exceptions.HANDSHAKE.UNAUTHORIZED or exceptions.HANDSHAKE.FORBIDDEN exception if "handshake_auth" special handler rejects the request.
     @staticmethod
-    def _create_handshake(http_request : bytes) -> bytes:
+    def _create_handshake(cls          : "WebsocketServer",
+                          http_request : bytes,
+                          addr         : tuple = None) -> dict:
         http_data = WebsocketServer._parse_http_request(http_request.decode(WebsocketServer.ENCODING_TYPE))
 
         # HTTP Request Validity Checks
@@ -244,6 +621,20 @@ class WebsocketServer:
 
         if len(websocket_key_decoded) != 16: raise ValueError("Sec-WebSocket-Key field's value must be 16 bytes when decoded.")
 
+        path, _, query_string = http_data["Path"].partition("?")
+        route, path_params    = None, {}
+
+        if cls._router:
+            resolved_route = cls._router.resolve(path)
+
+            if resolved_route is None:
+                raise exceptions.HANDSHAKE.ROUTE_NOT_FOUND("No route found for path \"{}\".".format(path))
+
+            route, path_params = resolved_route
+
+        # Rejected requests don't pay for the rest of the handshake.
+        auth_data = WebsocketServer._authenticate_handshake(cls, http_data, path, query_string, route, path_params, addr)
+
         sha1 = hashlib.sha1()
         sha1.update((websocket_key + WebsocketServer.MAGIC_NUMBER).encode(WebsocketServer.ENCODING_TYPE))
         sha1_bytes = sha1.digest()
@@ -256,7 +647,80 @@ class WebsocketServer:
         handshake_response += "Sec-WebSocket-Accept: {}\r\n".format(handshake_key)
         handshake_response += "\r\n"
 
-        return handshake_response.encode(WebsocketServer.ENCODING_TYPE)
+        return {
+            "response"     : handshake_response.encode(WebsocketServer.ENCODING_TYPE),
+            "http_data"    : http_data,
+            "path"         : path,
+            "query_string" : query_string,
+            "route"        : route,
+            "path_params"  : path_params,
+            "auth_data"    : auth_data
+        }
+
+    ## Calls "handshake_auth" special handler for the request, or uses it's cached result. Returns the data set by the handler.
+    # The handler is called as handler(server, request) where request is a dictionary with "path", "query_string", "headers", "cookies",
+    # "addr", "route", "path_params" and "data" keys. Items the handler puts into request["data"] are copied into WebsocketClient.data.
+    # Handler must return True to accept the request. Returning 401 rejects it with 401 Unauthorized, anything else rejects it with 403 Forbidden.
+    # If server has a handshake_auth_cache, the handler isn't called for a request whose cache key has a valid result. The result (including a copy of request["data"])
+    # is reused for every request with the same key, so the key must contain every part of the request the handler checks. See AuthCache.default_key.
+    # Rejections are only cached if the cache has a rejection_ttl.
+    # @warning Raises exceptions.HANDSHAKE.UNAUTHORIZED or exceptions.HANDSHAKE.FORBIDDEN exception if the request is rejected.
+    @staticmethod
+    def _authenticate_handshake(cls          : "WebsocketServer",
+                                http_data    : dict,
+                                path         : str,
+                                query_string : str,
+                                route        : Route,
+                                path_params  : dict,
+                                addr         : tuple) -> dict:
+        handshake_auth = cls._special_handler_list["handshake_auth"]
+
+        if handshake_auth is None:
+            return {}
+
+        cookie_list = {}
+
+        if "Cookie" in http_data:
+            try:
+                cookie_list = {key : morsel.value for key, morsel in SimpleCookie(http_data["Cookie"]).items()}
+            except CookieError:
+                pass
+
+        request = {
+            "path"         : path,
+            "query_string" : query_string,
+            "headers"      : http_data,
+            "cookies"      : cookie_list,
+            "addr"         : addr,
+            "route"        : route,
+            "path_params"  : path_params,
+            "data"         : {}
+        }
+
+        auth_cache = cls._handshake_auth_cache
+        cache_key  = auth_cache.get_key(request) if auth_cache is not None else None
+        result     = auth_cache.get(cache_key)   if cache_key  is not None else None
+
+        if result is None:
+            status = handshake_auth(cls, request)
+
+            if   status is True: status = 200
+            elif status != 401:  status = 403
+
+            result = (status, request["data"])
+
+            if cache_key is not None:
+                auth_cache.set(cache_key, (status, copy.deepcopy(request["data"])), status != 200)
+
+            status, auth_data = result
+        else:
+            # Clients mustn't share the mutable values of a cached result with each other.
+            status, auth_data = result[0], copy.deepcopy(result[1])
+
+        if   status == 401: raise exceptions.HANDSHAKE.UNAUTHORIZED("Request has been rejected by \"handshake_auth\" special handler.")
+        elif status == 403: raise exceptions.HANDSHAKE.FORBIDDEN("Request has been rejected by \"handshake_auth\" special handler.")
+
+        return auth_data
 
     ## Parses HTTP request into key/value (dict) pair.
     # @param http_request HTTP request string.
@@ -272,7 +736,7 @@ class WebsocketServer:
         }
 
         for line in request_split[1:]:
-            key_val_split = line.split(":")
+            key_val_split = line.split(":", 1)
             ret_val[key_val_split[0]] = key_val_split[1].strip()
 
         return ret_val
@@ -280,16 +744,31 @@ class WebsocketServer:
     ## Encodes the data that will be sent to client according to websocket packet structure and rules.
     # @param data Data that will be sent to client.
     # @param opcode OPCODE of frame.
+    # @param fin If set to False, frame will be marked as a fragment which is not the last one.
     # @note If OPCODE set to FrameType.TEXT_FRAME, client will receive data as UTF-8 string. If OPCODE set to FrameType.BINARY_FRAME, client will receive data as byte array.
     # @warning - Raises exceptions.DATA_LENGTH_ERROR exception if data's length is bigger than 0xFFFFFFFFFFFFFFFF.
     # @warning - Do not forget that all control frames MUST have a payload length of 125 bytes or less and MUST NOT be fragmented.
     @staticmethod
     def _encode_data(data   : bytes, 
-                     opcode : int) -> bytes:
+                     opcode : int,
+                     fin    : bool = True) -> bytes:
+        packet = WebsocketServer._encode_header(len(data), opcode, fin)
+        packet.extend(data)
+
+        return bytes(packet)
+
+    ## Encodes the header of a frame.
+    # @param data_len Length of frame's payload.
+    # @param opcode OPCODE of frame.
+    # @param fin If set to False, frame will be marked as a fragment which is not the last one.
+    # @warning Raises exceptions.DATA_LENGTH_ERROR exception if data_len is bigger than 0xFFFFFFFFFFFFFFFF.
+    @staticmethod
+    def _encode_header(data_len : int,
+                       opcode   : int,
+                       fin      : bool = True) -> bytearray:
         packet   = bytearray()
-        data_len = len(data)
 
-        FIN    = 0b10000000
+        FIN    = 0b10000000 if fin else 0b00000000
         RSV1   = 0b00000000
         RSV2   = 0b00000000
         RSV3   = 0b00000000
@@ -312,17 +791,99 @@ class WebsocketServer:
         else:
             raise exceptions.DATA_LENGTH_ERROR("Data length can't be bigger than 0xFFFFFFFFFFFFFFFF.")
 
-        packet.extend(data)
+        return packet
+
+    ## Yields the units (header and payload buffer pairs) of a message. Messages longer than fragment_size are split into fragments.
+    # @param data Data that will be sent to client.
+    # @param opcode OPCODE of message.
+    # @param fragment_size Maximum payload length of a fragment.
+    @staticmethod
+    def _iter_message_units(data          : bytes,
+                            opcode        : int,
+                            fragment_size : int) -> Iterator[list]:
+        data_view = memoryview(data).cast("B")
+        data_len  = len(data_view)
+
+        if data_len <= fragment_size:
+            yield [WebsocketServer._encode_header(data_len, opcode), data_view]
+            return
+
+        for offset in range(0, data_len, fragment_size):
+            fragment = data_view[offset:offset + fragment_size]
+
+            yield [WebsocketServer._encode_header(len(fragment),
+                                                  opcode if offset == 0 else custom_types.FrameType.CONTINUATION_FRAME,
+                                                  offset + fragment_size >= data_len),
+                   fragment]
+
+    ## Gets the total length (header + payload) of the frame at the beginning of the buffer. Returns None if header is not completely received yet.
+    # @param buffer Buffer that contains the received part of the frame.
+    # @param max_payload_len Maximum allowed payload length. If set to None, length won't be checked.
+    # @warning Raises exceptions.MESSAGE_TOO_BIG exception if the payload length is bigger than max_payload_len.
+    @staticmethod
+    def _get_frame_length(buffer          : memoryview,
+                          max_payload_len : int = None) -> int:
+        buffer_len = len(buffer)
+
+        if buffer_len < 2:
+            return None
+
+        MASK       = (buffer[1] >> 7) & 0x01
+        LEN        = (buffer[1] >> 0) & 0x7F
+        header_len = 2 + (4 if MASK else 0)
+
+        if   LEN == 126:
+            if buffer_len < 4: return None
+
+            header_len += 2
+            LEN         = struct.unpack_from("!H", buffer, 2)[0]
+        elif LEN == 127:
+            if buffer_len < 10: return None
+
+            header_len += 8
+            LEN         = struct.unpack_from("!Q", buffer, 2)[0]
+
+        if  max_payload_len is not None \
+        and LEN > max_payload_len:
+            raise exceptions.MESSAGE_TOO_BIG("Frame's payload length {} is bigger than {}.".format(LEN, max_payload_len))
+
+        return header_len + LEN
+
+    ## Unmasks the payload in place.
+    # @param payload Writable memoryview of the masked payload.
+    # @param mask_key 4 bytes long masking key.
+    @staticmethod
+    def _unmask_payload(payload  : memoryview,
+                        mask_key : bytes) -> None:
+        payload_len = len(payload)
+        word_len    = payload_len - (payload_len % 8)
+
+        # XOR 8 bytes at a time. Mask repeats every 4 bytes so it can be used as a 64-bit word in native byte order.
+        if word_len:
+            mask_word  = struct.unpack("=Q", mask_key * 2)[0]
+            word_view  = payload[:word_len].cast("Q")
+
+            for i in range(len(word_view)):
+                word_view[i] ^= mask_word
+
+            word_view.release()
+
+        for i in range(word_len, payload_len):
+            payload[i] ^= mask_key[i & 0x03]
 
-        return bytes(packet)
-    
     ## Decodes the packet sent from client.
     # @param packet Packet sent from client.
+    # @note If packet is writable (such as bytearray or memoryview of a bytearray), payload will be unmasked in place and returned data will be a memoryview of the packet. Otherwise a copy of the packet will be made.
     # @warning Raises exceptions.UNKNOWN_OPCODE exception if an unknown OPCODE is detected. Raises exceptions.CLOSE_CONNECTION exception if close connection OPCODE is detected. Raises exceptions.MASK_ERROR exception if unmasked frame is detected.
     @staticmethod
-    def _decode_packet(packet : bytes) -> bytes:
-        header = struct.unpack("!H", packet[:2])[0]
-        packet = packet[2:]
+    def _decode_packet(packet : Union[bytes, bytearray, memoryview]) -> dict:
+        packet = memoryview(packet)
+
+        if packet.readonly:
+            packet = memoryview(bytearray(packet))
+
+        header = struct.unpack_from("!H", packet, 0)[0]
+        offset = 2
 
         FIN    = (header >> 15) & 0x01
         RSV1   = (header >> 14) & 0x01
@@ -343,36 +904,24 @@ class WebsocketServer:
             raise exceptions.MASK_ERROR
 
         if   LEN == 126: 
-            LEN = struct.unpack("!H", packet[:2])[0]
-            packet = packet[2:]
+            LEN     = struct.unpack_from("!H", packet, offset)[0]
+            offset += 2
         elif LEN == 127:
-            LEN = struct.unpack("!Q", packet[:8])[0]
-            packet = packet[8:]
-
-        MASK_KEY = packet[:4]
-        packet   = packet[4:]
+            LEN     = struct.unpack_from("!Q", packet, offset)[0]
+            offset += 8
 
-        payload      = packet[:LEN]
-        payload_data = bytearray()
+        MASK_KEY = bytes(packet[offset:offset + 4])
+        offset  += 4
 
-        for i, byte in enumerate(payload):
-            payload_data.append(byte ^ MASK_KEY[i % 4])
+        payload = packet[offset:offset + LEN]
+        WebsocketServer._unmask_payload(payload, MASK_KEY)
 
         return {
             "FIN"    : FIN,
             "OPCODE" : OPCODE,
-            "data"   : bytes(payload_data)
+            "data"   : payload
         }
     
-    ## prints log to console if debug is enabled.
-    # @param title Title.
-    # @param msg Message.
-    def _print_log(self, 
-                   title : str, 
-                   msg   : str) -> None:
-        if self._debug:
-            print("pywebsocket - {} - {}".format(title, msg))
-
     ## generates random number between 0 and max UINT value of the running system.
     # @warning This method will cause endless loop if there are no available numbers left.
     def _generate_socket_id(self) -> int:
@@ -394,18 +943,35 @@ class WebsocketServer:
         client        = self._client_socket_list[socket_id]
         client_socket = client.get_socket()
 
-        client_socket.send(WebsocketServer._encode_data(struct.pack("!H", status_code), custom_types.ControlFrame.CLOSE_FRAME))
-        
+        try:
+            client.get_send_scheduler().send_buffers([WebsocketServer._encode_data(struct.pack("!H", status_code), custom_types.ControlFrame.CLOSE_FRAME)],
+                                                     custom_types.SendPriority.CONTROL,
+                                                     is_closing=True)
+        except exceptions.SOCKET_CLOSED:
+            pass
+
         client_socket.close()
         self._client_socket_list.pop(socket_id)
+
+        for topic in client.get_topic_list():
+            self.unsubscribe(socket_id, topic)
         
         self._client_thread_list[socket_id]["status"] = 0
         self._client_thread_list.pop(socket_id)
         
         if  call_special_handler \
-        and self._special_handler_list["client_disconnect"] is not None:
-            self._print_log("_close_client_socket()", "Calling \"client_disconnect\" special handler for socket id {}.".format(socket_id))
-            self._special_handler_list["client_disconnect"](self, client)
+        and client._client_disconnect_handler is not None:
+            if _handler_log.isEnabledFor(DEBUG):
+                log_event(_handler_log, DEBUG, "Calling \"client_disconnect\" handler for the socket.", socket_id=socket_id)
+
+            client._client_disconnect_handler(self, client)
+
+    ## Gets the lock that serializes the publishing and the replaying of the topic, so frames of a topic are sent in sequence number order.
+    # A topic always maps to the same lock, topics are spread over WebsocketServer.TOPIC_LOCK_COUNT locks.
+    # @param topic Topic name.
+    def _get_topic_lock(self,
+                        topic : str) -> threading.Lock:
+        return self._topic_lock_list[hash(topic) % len(self._topic_lock_list)]
 
     ## Checks if socket_id is a valid socket ID. If not, raises exceptions.INVALID_SOCKET_ID exception.
     # @param socket_id Client's given socket ID after sucessful handshake.
@@ -420,6 +986,7 @@ class WebsocketServer:
     ## Sets the callback function for special handlers.
     # @param handler_name Special handler's name.
     # @param func Callback function that will be called upon special cases. (Such as client connect etc.)
+    # @note "client_connect", "client_disconnect" and "client_data" handlers are also replaced for the clients that are already connected, unless they have connected through a route added with WebsocketServer.add_route.
     # @warning Raises KeyError exception if handler_name not in special handlers list. Raises exceptions.INVALID_METHOD exception if func paramater is not a callable.
     def set_special_handler(self, 
                             handler_name : str, 
@@ -430,60 +997,168 @@ class WebsocketServer:
         if not callable(func):
             raise exceptions.INVALID_METHOD("Param func is not callable.")
 
-        self._print_log("set_special_handler()", "Special handler for \"{}\" has been set.".format(handler_name))
+        log_event(_server_log, DEBUG, "Special handler has been set.", handler_name=handler_name)
         self._special_handler_list[handler_name] = func
 
+        if handler_name in Route.HANDLER_NAME_LIST:
+            old_default_route   = self._default_route
+            self._default_route = Route({name : self._special_handler_list[name] for name in Route.HANDLER_NAME_LIST})
+
+            for client in tuple(self._client_socket_list.values()):
+                if client._route is old_default_route:
+                    client._set_route(self._default_route)
+
+    ## Adds a route. Clients that connect through a path matching the pattern will use the route's handlers instead of the special handlers.
+    # Once a route is added, handshakes of the paths that don't match any route are rejected with 404 Not Found.
+    # @param pattern Path, path prefix or regular expression depending on route_type. Prefixes match on path segment boundaries, so "/chat" matches "/chat" and "/chat/room" but not "/chatroom".
+    # @param handler_list Dictionary of handler name and callback function pairs. Available handler names are "client_connect", "client_disconnect" and "client_data".
+    # @param route_type How pattern is matched against the request path. See custom_types.RouteType. Named groups of regular expressions can be accessed with WebsocketClient.get_path_params.
+    # @warning Raises KeyError exception if a handler name is unknown. Raises exceptions.INVALID_METHOD exception if a handler is not callable.
+    def add_route(self,
+                  pattern      : str,
+                  handler_list : dict,
+                  route_type   : custom_types.RouteType = custom_types.RouteType.EXACT) -> Route:
+        route = Route(handler_list, pattern, route_type)
+        self._router.add_route(route)
+
+        log_event(_server_log, DEBUG, "Route has been added.", pattern=route.get_pattern(), route_type=route_type)
+
+        return route
+
+    ## Gets the runtime statistics of the server.
+    # Contains the number of active and hibernated clients under "connections" key, the hit/miss counters of the receive buffer pool
+    # under "buffer_pool" key and the usage of topic history under "replay_buffer" key.
+    # See BufferPool.get_stats and ReplayBuffer.get_stats for more information.
+    def get_stats(self) -> dict:
+        hibernated_count = self._hibernator.get_count()
+
+        return {
+            "connections"   : {
+                "active"     : len(self._client_socket_list) - hibernated_count,
+                "hibernated" : hibernated_count
+            },
+            "buffer_pool"   : self._buffer_pool.get_stats(),
+            "replay_buffer" : self._replay_buffer.get_stats()
+        }
+
+    ## Gets the transport that server accepts the connections from.
+    def get_transport(self) -> Transport:
+        return self._transport
+
+    ## Gets whether the client is hibernated.
+    # @param socket_id Socket ID of the client.
+    def is_hibernated(self,
+                      socket_id : int) -> bool:
+        return self._hibernator.is_hibernated(socket_id)
+
+    ## Gets the tracer of the server.
+    def get_tracer(self) -> Tracer:
+        return self._tracer
+
+    ## Gets the history store of topics.
+    def get_replay_buffer(self) -> ReplayBuffer:
+        return self._replay_buffer
+
     ## Stops the server.
     def stop(self) -> None:
         self._is_running = False
+        self._hibernator.stop()
+        self._send_pump.stop()
 
     ## Starts the server.
     def start(self) -> None:
-        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self._server.bind(self._addr)
-
-        self._print_log("start()", "Socket binded.")
+        self._transport.listen()
 
-        self._server.listen()
-
-        self._print_log("start()", "Server listening for connection(s).")
+        log_event(_server_log, INFO, "Server listening for connection(s).", transport=type(self._transport).__name__)
 
         if self._special_handler_list["loop"] is not None:
-            self._print_log("start()", "Starting special handler \"loop\".")
+            log_event(_server_log, DEBUG, "Starting special handler \"loop\".")
             self._special_handler_list["loop"](self)
 
         self._is_running = True
 
         def impl() -> None:
-            self._print_log("start() - impl()", "Thread for handling handshakes is running.")
+            log_event(_server_log, DEBUG, "Thread for handling handshakes is running.")
 
             while self._is_running \
             and   self._thread_list["handshake"]["status"] == 1:
-                conn, addr = self._server.accept()
+                try:
+                    conn, addr = self._transport.accept()
+                except OSError as ex:
+                    log_event(_server_log, WARNING, "Couldn't accept connection.", error=str(ex))
+                    break
+
+                addr_str = self._transport.format_addr(addr)
 
-                self._print_log("start()", "New connection: {}:{}.".format(addr[0], addr[1]))
+                if _handshake_log.isEnabledFor(DEBUG):
+                    log_event(_handshake_log, DEBUG, "New connection.", addr=addr_str)
 
                 handshake_request = conn.recv(2048)
 
+                is_traced = self._tracer.sample()
+                span      = self._tracer.start_span("handshake", addr=addr_str) if is_traced else None
+                status    = 101
+
+                # Span is ended with the response status, so rejected handshakes are traced as well.
                 try:
-                    handshake = WebsocketServer._create_handshake(handshake_request)
+                    handshake = WebsocketServer._create_handshake(self, handshake_request, addr)
+                except exceptions.HANDSHAKE.UNAUTHORIZED:
+                    status = 401
+                    if _handshake_log.isEnabledFor(INFO):
+                        log_event(_handshake_log, INFO, "Connection is unauthorized. Closing connection.", addr=addr_str, status=status)
+                    conn.send("HTTP/1.1 401 Unauthorized\r\n\r\n".encode(WebsocketServer.ENCODING_TYPE))
+                    conn.close()
+                    continue
+                except exceptions.HANDSHAKE.FORBIDDEN:
+                    status = 403
+                    if _handshake_log.isEnabledFor(INFO):
+                        log_event(_handshake_log, INFO, "Connection is forbidden. Closing connection.", addr=addr_str, status=status)
+                    conn.send("HTTP/1.1 403 Forbidden\r\n\r\n".encode(WebsocketServer.ENCODING_TYPE))
+                    conn.close()
+                    continue
+                except exceptions.HANDSHAKE.ROUTE_NOT_FOUND as ex:
+                    status = 404
+                    if _handshake_log.isEnabledFor(INFO):
+                        log_event(_handshake_log, INFO, "Connection requested an unknown path. Closing connection.", addr=addr_str, status=status, error=str(ex))
+                    conn.send("HTTP/1.1 404 Not Found\r\n\r\n".encode(WebsocketServer.ENCODING_TYPE))
+                    conn.close()
+                    continue
                 except exceptions.HANDSHAKE.WEBSOCKET_VERSION_ERROR:
-                    self._print_log("start()", "Connection {}:{}'s websocket version doesn't match with server's. Closing connection.".format(addr[0], addr[1]))
+                    status = 400
+                    if _handshake_log.isEnabledFor(INFO):
+                        log_event(_handshake_log, INFO, "Connection's websocket version doesn't match with server's. Closing connection.", addr=addr_str, status=status)
                     conn.send(("HTTP/1.1 400 Bad Request\r\nSec-WebSocket-Version: {}\r\n\r\n".format(WebsocketServer.WEBSOCKET_VERSION)).encode(WebsocketServer.ENCODING_TYPE))
                     conn.close()
                     continue
                 except Exception as ex:
-                    self._print_log("start()", "Connection {}:{} didn't send a valid handshake request. Closing connection. ({})".format(addr[0], addr[1], str(ex)))
+                    status = 400
+                    if _handshake_log.isEnabledFor(INFO):
+                        log_event(_handshake_log, INFO, "Connection didn't send a valid handshake request. Closing connection.", addr=addr_str, status=status, error=str(ex))
                     conn.send("HTTP/1.1 400 Bad Request\r\n\r\n".encode(WebsocketServer.ENCODING_TYPE))
                     conn.close()
                     continue
-
-                conn.send(handshake)
+                else:
+                    conn.send(handshake["response"])
+                finally:
+                    if span is not None: span.end(status=status)
 
                 client_socket_id = self._generate_socket_id()
                 client_thread    = threading.Thread(target=WebsocketServer._client_handler, args=(self, client_socket_id))
                 
-                self._client_socket_list[client_socket_id] = WebsocketClient(client_socket_id, conn, addr)
+                route = handshake["route"]
+
+                # Server's special handlers are used when no route has been added.
+                if route is None:
+                    route = self._default_route
+
+                self._client_socket_list[client_socket_id] = WebsocketClient(client_socket_id, conn, addr,
+                                                                             path         = handshake["path"],
+                                                                             query_string = handshake["query_string"],
+                                                                             route        = route,
+                                                                             path_params  = handshake["path_params"],
+                                                                             send_pump    = self._send_pump)
+                self._client_socket_list[client_socket_id].data.update(handshake["auth_data"])
+                self._client_socket_list[client_socket_id]._is_traced = is_traced
 
                 self._client_thread_list[client_socket_id] = {
                     "id"     : client_socket_id,
@@ -494,8 +1169,8 @@ class WebsocketServer:
                 client_thread.daemon = True
                 client_thread.start()
         
-            self._print_log("start() - impl()", "Closing the server.")
-            self._server.close()
+            log_event(_server_log, INFO, "Closing the server.")
+            self._transport.close()
 
         handshake_thread = threading.Thread(target=impl, args=())
 
@@ -511,33 +1186,48 @@ class WebsocketServer:
     # @param socket_id Socket ID of the client that will receive the data.
     # @param data Data that will be sent.
     # @param frame_type Type of frame. See WebsocketServer._encode_data for more information.
+    # @param priority Priority class of the message. custom_types.SendPriority.HIGH messages are sent before the queued bulk messages.
+    # @note Method blocks until the data is written to socket. Raises exceptions.SOCKET_CLOSED exception if the connection is closed.
     def send_data(self, 
                   socket_id  : int,
                   data       : bytes,
-                  frame_type : custom_types.FrameType = custom_types.FrameType.BINARY_FRAME) -> None:
+                  frame_type : custom_types.FrameType    = custom_types.FrameType.BINARY_FRAME,
+                  priority   : custom_types.SendPriority = custom_types.SendPriority.BULK) -> None:
         if frame_type == custom_types.FrameType.CONTINUATION_FRAME:
             raise exceptions.INVALID_OPCODE("OPCODE cannot be continuation frame.")
+
+        if priority == custom_types.SendPriority.CONTROL:
+            raise ValueError("Priority of data frames cannot be SendPriority.CONTROL.")
         
         self._check_socket_id(socket_id)
 
-        socket = self._client_socket_list[socket_id].get_socket()
-        socket.send(WebsocketServer._encode_data(data, frame_type))
+        client    = self._client_socket_list[socket_id]
+        scheduler = client.get_send_scheduler()
+        span      = self._tracer.start_span("send", socket_id=socket_id, length=len(data), priority=priority) if client._is_traced else None
+
+        scheduler.send(WebsocketServer._iter_message_units(data, frame_type, self._send_fragment_size), priority)
+
+        if span is not None: span.end()
 
     ## Sends the data as string to socket.
     # @param socket_id Socket ID of the client that will receive the data.
     # @param str String that will be sent.
+    # @param priority Priority class of the message. See WebsocketServer.send_data for more information.
     def send_string(self,
                     socket_id : int,
-                    str       : str) -> None:
-        self.send_data(socket_id, str.encode(WebsocketServer.ENCODING_TYPE), custom_types.FrameType.TEXT_FRAME)
+                    str       : str,
+                    priority  : custom_types.SendPriority = custom_types.SendPriority.BULK) -> None:
+        self.send_data(socket_id, str.encode(WebsocketServer.ENCODING_TYPE), custom_types.FrameType.TEXT_FRAME, priority)
 
     ## Sends the data as JSON encoded string to socket.
     # @param socket_id Socket ID of the client that will receive the data.
     # @param dict Dictionary object that will be encoded as JSON string and sent to client.
+    # @param priority Priority class of the message. See WebsocketServer.send_data for more information.
     def send_json(self,
                   socket_id : int,
-                  dict      : dict) -> None:
-        self.send_string(socket_id, json.dumps(dict))
+                  dict      : dict,
+                  priority  : custom_types.SendPriority = custom_types.SendPriority.BULK) -> None:
+        self.send_string(socket_id, json.dumps(dict), priority)
 
     ## Sends the data to all sockets.
     # @param send_func Method reference to call for sending the data. It can only be reference to WebsocketServer.send_data, WebsocketServer.send_string or WebsocketServer.send_json. Otherwise method will raise exceptions.INVALID_SEND_METHOD exception.
@@ -552,3 +1242,153 @@ class WebsocketServer:
 
         for socket_id in self._client_socket_list:
             send_func(socket_id, data)
+
+    ## Subscribes the socket to the topic. Frames published to the topic will be sent to the socket.
+    # Returns the number of frames replayed.
+    # @param socket_id Socket ID of the client.
+    # @param topic Topic name.
+    # @param seq If not None, frames published after this sequence number are replayed to the socket before any new frame. Pass 0 to replay all kept frames.
+    # @note Replayed frames are queued while publishing to the topic is blocked, so no frame is missed or sent twice between the replay and the live frames.
+    def subscribe(self,
+                  socket_id : int,
+                  topic     : str,
+                  seq       : int = None) -> int:
+        self._check_socket_id(socket_id)
+
+        scheduler = self._client_socket_list[socket_id].get_send_scheduler()
+
+        with self._get_topic_lock(topic):
+            self._client_socket_list[socket_id]._topic_list.add(topic)
+            self._topic_list.setdefault(topic, set()).add(socket_id)
+
+            if seq is None:
+                return 0
+
+            frame_list = self._replay_buffer.get_since(topic, seq)
+
+            if frame_list:
+                scheduler.post(iter([frame_list]))
+
+        scheduler.flush()
+
+        return len(frame_list)
+
+    ## Unsubscribes the socket from the topic.
+    # @param socket_id Socket ID of the client.
+    # @param topic Topic name.
+    def unsubscribe(self,
+                    socket_id : int,
+                    topic     : str) -> None:
+        client = self._client_socket_list.get(socket_id)
+
+        if client is not None:
+            client._topic_list.discard(topic)
+
+        subscriber_list = self._topic_list.get(topic)
+
+        if subscriber_list is not None:
+            subscriber_list.discard(socket_id)
+
+            if not subscriber_list:
+                self._topic_list.pop(topic, None)
+
+    ## Publishes the data to the topic. Data is encoded once, kept in topic's history and sent to all subscribers.
+    # Returns the sequence number given to the frame. Sequence numbers are shared by all topics and increase with every publish.
+    # Publishes to the same topic are serialized, so every subscriber receives the frames of a topic in sequence number order.
+    # Frames are queued to the subscribers while the topic's lock is held and written after it is released, without waiting for
+    # a subscriber whose socket can't take them; the server's SendPump writes those once the socket becomes writable.
+    # A subscriber that already has SendScheduler.MAX_POSTED_COUNT frames queued is disconnected, so it can reconnect and catch up with a replay.
+    # @param topic Topic name.
+    # @param data Data that will be sent. It can also be a callable which receives the sequence number and returns the data.
+    # @param frame_type Type of frame. See WebsocketServer._encode_data for more information.
+    def publish(self,
+                topic      : str,
+                data       : Union[bytes, Callable[[int], bytes]],
+                frame_type : custom_types.FrameType = custom_types.FrameType.BINARY_FRAME) -> int:
+        if frame_type == custom_types.FrameType.CONTINUATION_FRAME:
+            raise exceptions.INVALID_OPCODE("OPCODE cannot be continuation frame.")
+
+        frame_list = []
+
+        def build_frame(seq : int) -> bytes:
+            frame = WebsocketServer._encode_data(data(seq) if callable(data) else data, frame_type)
+            frame_list.append(frame)
+            return frame
+
+        scheduler_list = []
+
+        with self._get_topic_lock(topic):
+            seq = self._replay_buffer.append(topic, build_frame)
+
+            for socket_id in tuple(self._topic_list.get(topic, ())):
+                client = self._client_socket_list.get(socket_id)
+
+                if client is None:
+                    continue
+
+                scheduler = client.get_send_scheduler()
+
+                try:
+                    scheduler.post(iter([[frame_list[0]]]))
+                except exceptions.SOCKET_CLOSED as ex:
+                    # Client's own thread will notice the broken connection and close it.
+                    log_event(_server_log, WARNING, "Couldn't publish frame to the socket.", socket_id=socket_id, topic=topic, error=str(ex))
+                    continue
+                except exceptions.SEND_QUEUE_FULL as ex:
+                    # Client's own thread will notice the shut down socket and close it.
+                    log_event(_server_log, WARNING, "Disconnecting subscriber that isn't reading.", socket_id=socket_id, topic=topic, seq=seq)
+                    scheduler.abort(ex)
+                    continue
+
+                scheduler_list.append(scheduler)
+
+        for scheduler in scheduler_list:
+            scheduler.flush()
+
+        return seq
+
+    ## Publishes the string to the topic.
+    # @param topic Topic name.
+    # @param str String that will be sent.
+    def publish_string(self,
+                       topic : str,
+                       str   : str) -> int:
+        return self.publish(topic, str.encode(WebsocketServer.ENCODING_TYPE), custom_types.FrameType.TEXT_FRAME)
+
+    ## Publishes the dictionary as JSON encoded string to the topic.
+    # @param topic Topic name.
+    # @param dict Dictionary object that will be encoded as JSON string.
+    # @param seq_key If not None, sequence number given to the frame will be added to the JSON object with this key.
+    def publish_json(self,
+                     topic   : str,
+                     dict    : dict,
+                     seq_key : str = "seq") -> int:
+        def build_data(seq : int) -> bytes:
+            json_dict = dict if seq_key is None else {**dict, seq_key : seq}
+            return json.dumps(json_dict).encode(WebsocketServer.ENCODING_TYPE)
+
+        return self.publish(topic, build_data, custom_types.FrameType.TEXT_FRAME)
+
+    ## Sends the frames of the topic that have been published after the given sequence number to socket in a single vectored write.
+    # Returns the number of frames sent.
+    # @param socket_id Socket ID of the client.
+    # @param topic Topic name.
+    # @param seq Sequence number of the last frame that the client has received. Pass 0 to send all kept frames.
+    # @note Replayed frames aren't interleaved with the frames published at the same time. They are queued while the topic's lock is held and written after it is released.
+    def replay(self,
+               socket_id : int,
+               topic     : str,
+               seq       : int = 0) -> int:
+        self._check_socket_id(socket_id)
+
+        scheduler = self._client_socket_list[socket_id].get_send_scheduler()
+
+        with self._get_topic_lock(topic):
+            frame_list = self._replay_buffer.get_since(topic, seq)
+
+            if frame_list:
+                scheduler.post(iter([frame_list]))
+
+        scheduler.flush()
+
+        return len(frame_list)
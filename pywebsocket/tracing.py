@@ -0,0 +1,79 @@
+"""
+    Author: Ege Bilecen
+"""
+
+from typing import Callable
+import logging
+import random
+import time
+
+from . import custom_types
+from . import log
+
+## Span
+# Measures the duration of an operation. Created by Tracer.start_span.
+class Span:
+    __slots__ = ("_tracer", "_name", "_start_time", "_fields")
+
+    def __init__(self,
+                 tracer : "Tracer",
+                 name   : str,
+                 fields : dict) -> None:
+        self._tracer     = tracer
+        self._name       = name
+        self._fields     = fields
+        self._start_time = time.perf_counter()
+
+    ## Ends the span and reports it to the tracer.
+    # @param fields Extra fields that will be added to span.
+    def end(self,
+            **fields) -> None:
+        duration = time.perf_counter() - self._start_time
+
+        if fields:
+            self._fields.update(fields)
+
+        self._tracer._report(self._name, duration, self._fields)
+
+## Tracer
+# Creates the spans around handshake, decode, handler and send operations of sampled connections.
+# Sampling decision is made once per connection, so a sampled connection is traced end to end while
+# the rest of the connections only pay for a boolean check.
+class Tracer:
+    ## Constructor of Tracer.
+    # @param sample_rate Ratio of the connections that will be traced. Between 0.0 (disabled) and 1.0 (all).
+    # @param span_handler Callable that will be called as span_handler(name, duration, fields) when a span ends. If set to None, spans are logged to "pywebsocket.trace" logger at DEBUG level.
+    def __init__(self,
+                 sample_rate  : float                              = 0.0,
+                 span_handler : Callable[[str, float, dict], None] = None) -> None:
+        if not 0.0 <= sample_rate <= 1.0:
+            raise ValueError("sample_rate must be between 0.0 and 1.0.")
+
+        self._sample_rate  = sample_rate
+        self._span_handler = span_handler
+        self._logger       = log.get_logger(custom_types.LogSubsystem.TRACE)
+
+    ## Gets the sample rate of tracer.
+    def get_sample_rate(self) -> float:
+        return self._sample_rate
+
+    ## Decides whether a new connection will be traced.
+    def sample(self) -> bool:
+        return self._sample_rate > 0.0 and random.random() < self._sample_rate
+
+    ## Starts a span.
+    # @param name Name of the operation.
+    def start_span(self,
+                   name : str,
+                   **fields) -> Span:
+        return Span(self, name, fields)
+
+    ## Reports an ended span.
+    def _report(self,
+                name     : str,
+                duration : float,
+                fields   : dict) -> None:
+        if self._span_handler is not None:
+            self._span_handler(name, duration, fields)
+        elif self._logger.isEnabledFor(logging.DEBUG):
+            log.log_event(self._logger, logging.DEBUG, "Span \"{}\" took {:.6f} seconds.".format(name, duration), span=name, duration=duration, **fields)
@@ -0,0 +1,290 @@
+"""
+    Author: Ege Bilecen
+"""
+
+import os
+import queue
+import socket
+import stat
+
+## SocketOptions
+# Validated socket tuning options of a transport.
+class SocketOptions:
+    ## Constructor of SocketOptions.
+    # @param tcp_nodelay Disable Nagle's algorithm on accepted TCP connections.
+    # @param send_buffer_size SO_SNDBUF value in bytes. If set to None, OS default will be used.
+    # @param recv_buffer_size SO_RCVBUF value in bytes. If set to None, OS default will be used.
+    # @param listen_backlog Maximum number of pending connections.
+    # @param defer_accept Number of seconds that TCP_DEFER_ACCEPT will wait for the handshake request before waking up accept. If set to None, it won't be used. Only available on Linux.
+    # @warning Raises ValueError exception if an option has an invalid value or isn't supported on the running system.
+    def __init__(self,
+                 tcp_nodelay      : bool = False,
+                 send_buffer_size : int  = None,
+                 recv_buffer_size : int  = None,
+                 listen_backlog   : int  = 128,
+                 defer_accept     : int  = None) -> None:
+        if not isinstance(tcp_nodelay, bool):
+            raise ValueError("tcp_nodelay must be a bool.")
+
+        for name, value in (("send_buffer_size", send_buffer_size), ("recv_buffer_size", recv_buffer_size)):
+            if value is not None \
+            and (not isinstance(value, int) or value <= 0):
+                raise ValueError("{} must be a positive integer.".format(name))
+
+        if not isinstance(listen_backlog, int) or listen_backlog < 0:
+            raise ValueError("listen_backlog must be a non-negative integer.")
+
+        if defer_accept is not None:
+            if not isinstance(defer_accept, int) or defer_accept <= 0:
+                raise ValueError("defer_accept must be a positive integer.")
+
+            if not hasattr(socket, "TCP_DEFER_ACCEPT"):
+                raise ValueError("TCP_DEFER_ACCEPT is not supported on this system.")
+
+        self.tcp_nodelay      = tcp_nodelay
+        self.send_buffer_size = send_buffer_size
+        self.recv_buffer_size = recv_buffer_size
+        self.listen_backlog   = listen_backlog
+        self.defer_accept     = defer_accept
+
+    ## Applies the buffer sizes to a socket.
+    # @param sock Socket that options will be applied to.
+    def _apply_buffer_sizes(self,
+                            sock : socket.socket) -> None:
+        if self.send_buffer_size is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.send_buffer_size)
+
+        if self.recv_buffer_size is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.recv_buffer_size)
+
+    ## Applies the options to a listening socket. Must be called before listen().
+    # @param sock Listening socket.
+    def apply_to_listener(self,
+                          sock : socket.socket) -> None:
+        # Accepted sockets inherit the buffer sizes of the listening socket, and they have to be set before listen() to affect TCP window scaling.
+        self._apply_buffer_sizes(sock)
+
+        if  self.defer_accept is not None \
+        and sock.family in (socket.AF_INET, socket.AF_INET6):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_DEFER_ACCEPT, self.defer_accept)
+
+    ## Applies the options to an accepted connection.
+    # @param sock Accepted socket.
+    def apply_to_connection(self,
+                            sock : socket.socket) -> None:
+        if  self.tcp_nodelay \
+        and sock.family in (socket.AF_INET, socket.AF_INET6):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+## Transport
+# Base class of the transports that server accepts the connections from.
+class Transport:
+    ## Constructor of Transport.
+    # @param options Socket tuning options. If set to None, default SocketOptions will be used.
+    def __init__(self,
+                 options : SocketOptions = None) -> None:
+        self._socket  = None
+        self._options = options if options is not None else SocketOptions()
+
+    ## Creates the bound (but not listening) socket. Must be implemented by subclasses.
+    def _create_socket(self) -> socket.socket:
+        raise NotImplementedError
+
+    ## Gets the listening socket. None if transport isn't listening.
+    def get_socket(self) -> socket.socket:
+        return self._socket
+
+    ## Gets the socket options of transport.
+    def get_options(self) -> SocketOptions:
+        return self._options
+
+    ## Starts listening for connections.
+    def listen(self) -> None:
+        self._socket = self._create_socket()
+        self._options.apply_to_listener(self._socket)
+        self._socket.listen(self._options.listen_backlog)
+
+    ## Waits for a connection. Returns the socket and address pair of the connection.
+    def accept(self) -> tuple:
+        conn, addr = self._socket.accept()
+        self._options.apply_to_connection(conn)
+
+        return conn, addr
+
+    ## Stops listening for connections.
+    def close(self) -> None:
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    ## Formats the address of a connection for logs.
+    # @param addr Address returned from Transport.accept.
+    def format_addr(self,
+                    addr) -> str:
+        if isinstance(addr, tuple) and len(addr) >= 2:
+            return "{}:{}".format(addr[0], addr[1])
+
+        return str(addr) if addr else "<{}>".format(type(self).__name__)
+
+## TCPTransport
+# IPv4 TCP transport.
+class TCPTransport(Transport):
+    ## Constructor of TCPTransport.
+    # @param ip IP address that will be bound.
+    # @param port Port number that will be bound.
+    # @param options Socket tuning options.
+    def __init__(self,
+                 ip      : str           = "",
+                 port    : int           = 3630,
+                 options : SocketOptions = None) -> None:
+        super().__init__(options)
+
+        self._addr = (ip, port)
+
+    def _create_socket(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(self._addr)
+
+        return sock
+
+## TCP6Transport
+# IPv6 TCP transport. If dual_stack is set to True, IPv4 clients will be accepted as well.
+class TCP6Transport(Transport):
+    ## Constructor of TCP6Transport.
+    # @param ip IPv6 address that will be bound.
+    # @param port Port number that will be bound.
+    # @param dual_stack Accept IPv4 connections (as IPv4-mapped IPv6 addresses) too.
+    # @param options Socket tuning options.
+    def __init__(self,
+                 ip         : str           = "::",
+                 port       : int           = 3630,
+                 dual_stack : bool          = True,
+                 options    : SocketOptions = None) -> None:
+        super().__init__(options)
+
+        if not socket.has_ipv6:
+            raise ValueError("IPv6 is not supported on this system.")
+
+        if  dual_stack \
+        and hasattr(socket, "has_dualstack_ipv6") \
+        and not socket.has_dualstack_ipv6():
+            raise ValueError("Dual-stack IPv6 sockets are not supported on this system.")
+
+        self._addr       = (ip, port)
+        self._dual_stack = dual_stack
+
+    def _create_socket(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
+        sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 0 if self._dual_stack else 1)
+        sock.bind(self._addr)
+
+        return sock
+
+    def format_addr(self,
+                    addr) -> str:
+        return "[{}]:{}".format(addr[0], addr[1])
+
+## UnixTransport
+# UNIX domain socket transport. Avoids the loopback TCP stack when server is behind a local reverse proxy.
+class UnixTransport(Transport):
+    ## Constructor of UnixTransport.
+    # @param path File system path of the socket.
+    # @param remove_existing Remove a stale socket file at path before binding.
+    # @param permissions If not None, permissions of the socket file will be set to this value (such as 0o660).
+    # @param options Socket tuning options. TCP specific options are ignored.
+    def __init__(self,
+                 path            : str,
+                 remove_existing : bool          = True,
+                 permissions     : int           = None,
+                 options         : SocketOptions = None) -> None:
+        super().__init__(options)
+
+        if not hasattr(socket, "AF_UNIX"):
+            raise ValueError("UNIX domain sockets are not supported on this system.")
+
+        self._path            = path
+        self._remove_existing = remove_existing
+        self._permissions     = permissions
+
+    def _create_socket(self) -> socket.socket:
+        if  self._remove_existing \
+        and os.path.exists(self._path) \
+        and stat.S_ISSOCK(os.stat(self._path).st_mode):
+            os.unlink(self._path)
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(self._path)
+
+        if self._permissions is not None:
+            os.chmod(self._path, self._permissions)
+
+        return sock
+
+    def close(self) -> None:
+        super().close()
+
+        if os.path.exists(self._path):
+            os.unlink(self._path)
+
+    def format_addr(self,
+                    addr) -> str:
+        return "unix:{}".format(addr if addr else self._path)
+
+## InheritedSocketTransport
+# Transport for an already bound socket inherited from the parent process (such as systemd socket activation).
+class InheritedSocketTransport(Transport):
+    ## Constructor of InheritedSocketTransport.
+    # @param fd File descriptor of the bound socket.
+    # @param options Socket tuning options.
+    def __init__(self,
+                 fd      : int,
+                 options : SocketOptions = None) -> None:
+        super().__init__(options)
+
+        self._fd = fd
+
+    def _create_socket(self) -> socket.socket:
+        sock = socket.socket(fileno=self._fd)
+
+        if sock.type != socket.SOCK_STREAM:
+            sock.detach()
+            raise ValueError("Inherited file descriptor {} is not a stream socket.".format(self._fd))
+
+        return sock
+
+## SocketPairTransport
+# In-memory transport for tests. Each call to SocketPairTransport.connect creates a connected socket pair,
+# hands one end to the server and returns the other end to the caller.
+class SocketPairTransport(Transport):
+    def __init__(self,
+                 options : SocketOptions = None) -> None:
+        super().__init__(options)
+
+        self._pending_list = queue.Queue()
+        self._is_listening = False
+
+    def listen(self) -> None:
+        self._is_listening = True
+
+    ## Creates a new connection to server. Returns the client end of the connection.
+    def connect(self) -> socket.socket:
+        if not self._is_listening:
+            raise ConnectionRefusedError("Transport is not listening.")
+
+        server_end, client_end = socket.socketpair()
+        self._pending_list.put(server_end)
+
+        return client_end
+
+    def accept(self) -> tuple:
+        conn = self._pending_list.get()
+
+        if conn is None:
+            raise OSError("Transport has been closed.")
+
+        return conn, None
+
+    def close(self) -> None:
+        if self._is_listening:
+            self._is_listening = False
+            self._pending_list.put(None)